@@ -1,22 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
-import io
 import json
 import base64
 import numpy as np
-from PIL import Image
 import cv2
 import torch
-import matplotlib
-import matplotlib.pyplot as plt
 from datetime import datetime
 import tempfile
 import traceback
+import warnings
 
+from colormap import colorize_depth
+from depth_codec import DEPTH_COMPRESSIONS, DEPTH_DTYPES, encode_depth_map, zstandard
+import serving_path  # noqa: F401, serving package of the YOLOv5 app
+from serving.batching import MicroBatcher
+from serving.image_decode import decode_image
+from serving.responses import IMAGE_CODECS, encode_image, image_parts_from_form
+from serving.result_cache import ResultCache
 # Import Depth Anything V2 components
 try:
-    from depth_anything_v2.dpt import DepthAnythingV2
+    from depth_anything_v2.backend import DepthMultiBackend
 except ImportError as e:
     print(f"Warning: Depth Anything V2 imports failed: {e}")
     print("Make sure depth_anything_v2 is properly installed")
@@ -34,42 +38,78 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 DEPTH_CONFIG = {
     'encoder': 'vits',  # Change to 'vitb', 'vitl', or 'vitg' as needed
     'input_size': 518,
-    'checkpoint_path': 'checkpoints/depth_anything_v2_vits.pth',  # Update path as needed
+    'checkpoint_path': 'checkpoints/depth_anything_v2_vits.pth',  # *.pth, or *.onnx / *_openvino_model from export.py
     'device': 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu',
     'grayscale': False,
-    'pred_only': False
+    'colormap': 'Spectral_r',  # See colormap.COLORMAPS; ignored when grayscale is set
+    'pred_only': False,
+    'compile': None,  # None (eager), 'compile' (torch.compile) or 'freeze' (frozen TorchScript per input shape)
+    'compile_image_sizes': [(480, 640), (640, 480), (640, 640)],  # (h, w) aspect ratios whose input shapes get compiled
+    'compile_cache_dir': 'compile_cache',  # Compiled artifacts reused across restarts
+    'reduced_decode': True,  # Decode large JPEGs at reduced resolution (midpoints are still given in original pixels)
+    'tiled': False,  # Sliding-window inference on overlapping tiles at full resolution (for very large images)
+    'tile_size': None,  # Tile side in image pixels (None: half the short side, at least input_size)
+    'tile_overlap': 0.25,  # Fraction of a tile shared with its neighbours, blended across
+    'max_batch_size': 4,  # Max concurrent requests merged into one forward pass (1 disables batching)
+    'max_batch_wait_ms': 10,  # Max time the first request in a batch waits for others
+    'box_grid': 16,  # Per-box depth samples per side for median/percentiles (grid x grid samples)
+    'box_percentiles': [10, 25, 75, 90],  # Percentiles reported per box
+    'box_trim': 0.1,  # Fraction trimmed from each end for the trimmed mean
+    'image_codec': 'jpeg',  # Codec for returned images: 'jpeg', 'png' or 'webp'
+    'image_quality': 90,  # Returned image quality (png: compression level 0-9)
+    'depth_compression': 'deflate',  # Default compression of raw depth maps: 'none', 'deflate' or 'zstd'
+    'cache_max_mb': 256,  # Memory budget of the result cache for repeated uploads (0 disables caching)
+    'cache_ttl_s': 600,  # Seconds a cached result stays valid
+    'cache_dir': None  # Optional directory shared by all workers, e.g. '/dev/shm/depth-cache'
 }
 
 # Global model variable
 depth_model = None
 device = None
+depth_batcher = None
+result_cache = None
 
 def load_depth_model():
     """Load Depth Anything V2 model once on startup"""
-    global depth_model, device
+    global depth_model, device, depth_batcher, result_cache
     
     try:
         device = DEPTH_CONFIG['device']
         
-        # Model configurations
-        model_configs = {
-            'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
-            'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
-            'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]},
-            'vitg': {'encoder': 'vitg', 'features': 384, 'out_channels': [1536, 1536, 1536, 1536]}
-        }
-        
-        # Initialize model
+        # Load checkpoint (PyTorch, ONNX Runtime or OpenVINO)
         encoder = DEPTH_CONFIG['encoder']
-        depth_model = DepthAnythingV2(**model_configs[encoder])
-        
-        # Load checkpoint
         checkpoint_path = DEPTH_CONFIG['checkpoint_path']
         if not os.path.exists(checkpoint_path):
             raise FileNotFoundError(f"Checkpoint not found: {checkpoint_path}")
             
-        depth_model.load_state_dict(torch.load(checkpoint_path, map_location='cpu'))
-        depth_model = depth_model.to(device).eval()
+        depth_model = DepthMultiBackend(checkpoint_path, encoder=encoder, device=device)
+        
+        # Compile for every input shape and batch size requests are expected to produce, then warm up
+        if DEPTH_CONFIG['compile']:
+            sizes = {tuple(depth_model.image2tensor(np.zeros((h, w, 3), dtype=np.uint8), DEPTH_CONFIG['input_size'])[0].shape[-2:])
+                     for h, w in DEPTH_CONFIG['compile_image_sizes']}
+            shapes = [(bs, 3, h, w) for h, w in sorted(sizes) for bs in range(1, max(1, DEPTH_CONFIG['max_batch_size']) + 1)]
+            st = os.stat(checkpoint_path)
+            depth_model.optimize(DEPTH_CONFIG['compile'], shapes, DEPTH_CONFIG['compile_cache_dir'],
+                                 tag=f'{os.path.abspath(checkpoint_path)}:{st.st_size}:{st.st_mtime_ns}')
+        
+        # Micro-batching of concurrent requests, bucketed by padded input size
+        if DEPTH_CONFIG['max_batch_size'] > 1:
+            depth_batcher = MicroBatcher(
+                depth_model.infer_tensors,
+                max_batch_size=DEPTH_CONFIG['max_batch_size'],
+                max_wait_ms=DEPTH_CONFIG['max_batch_wait_ms'],
+                bucket_key=lambda item: tuple(item[0].shape[-2:]),
+                name='depth-batcher'
+            )
+        
+        # Cache of results for byte-identical uploads
+        if DEPTH_CONFIG['cache_max_mb'] > 0:
+            result_cache = ResultCache(
+                max_bytes=DEPTH_CONFIG['cache_max_mb'] * 1024 * 1024,
+                ttl_s=DEPTH_CONFIG['cache_ttl_s'],
+                disk_dir=DEPTH_CONFIG['cache_dir']
+            )
         
         print(f"Depth Anything V2 model loaded successfully on {device}")
         print(f"Encoder: {encoder}")
@@ -86,17 +126,18 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def preprocess_image(image_file):
-    """Preprocess image for depth estimation"""
+def preprocess_image(image_bytes):
+    """Preprocess image for depth estimation, returns the BGR image and the original (height, width)
+    
+    With reduced_decode, JPEGs much larger than the model input are decoded at
+    1/2, 1/4 or 1/8 scale, never below input_size on the short side. Tiled
+    inference always gets the full resolution.
+    """
     try:
-        # Read image from file object
-        image = Image.open(image_file).convert('RGB')
-        img_array = np.array(image)
-        
-        # Convert RGB to BGR for OpenCV (Depth Anything expects BGR)
-        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        
-        return img_bgr, img_array
+        # Decode straight to BGR (Depth Anything expects BGR)
+        reduce = DEPTH_CONFIG['reduced_decode'] and not DEPTH_CONFIG['tiled']
+        min_short_side = DEPTH_CONFIG['input_size'] if reduce else 0
+        return decode_image(image_bytes, min_short_side=min_short_side)
         
     except Exception as e:
         raise Exception(f"Error preprocessing image: {e}")
@@ -104,8 +145,16 @@ def preprocess_image(image_file):
 def estimate_depth(img_bgr):
     """Run depth estimation on image"""
     try:
-        with torch.no_grad():
-            depth = depth_model.infer_image(img_bgr, DEPTH_CONFIG['input_size'])
+        if DEPTH_CONFIG['tiled']:
+            # Tiles of one image already share a forward pass
+            depth = depth_model.infer_tiled(img_bgr, DEPTH_CONFIG['input_size'], DEPTH_CONFIG['tile_size'],
+                                            DEPTH_CONFIG['tile_overlap'])
+        elif depth_batcher is not None:
+            # Preprocess on the request thread, share the forward pass with concurrent requests
+            depth = depth_batcher.submit(depth_model.image2tensor(img_bgr, DEPTH_CONFIG['input_size']))
+        else:
+            with torch.no_grad():
+                depth = depth_model.infer_image(img_bgr, DEPTH_CONFIG['input_size'])
         
         # Normalize depth to 0-255 range
         depth_normalized = (depth - depth.min()) / (depth.max() - depth.min()) * 255.0
@@ -116,15 +165,25 @@ def estimate_depth(img_bgr):
     except Exception as e:
         raise Exception(f"Error during depth estimation: {e}")
 
+def cached_estimate_depth(image_bytes, img_bgr):
+    """estimate_depth() behind the result cache, keyed by the uploaded bytes and DEPTH_CONFIG"""
+    if result_cache is None:
+        return estimate_depth(img_bgr)
+    
+    key = result_cache.make_key(image_bytes, DEPTH_CONFIG)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    depth, depth_uint8 = estimate_depth(img_bgr)
+    result_cache.put(key, (depth, depth_uint8))  # also makes them read-only, they are shared between requests now
+    return depth, depth_uint8
+
 def create_depth_visualization(raw_image, depth_uint8):
     """Create depth visualization with colormap"""
     try:
-        cmap = matplotlib.colormaps.get_cmap('Spectral_r')
-        
-        if DEPTH_CONFIG['grayscale']:
-            depth_colored = np.repeat(depth_uint8[..., np.newaxis], 3, axis=-1)
-        else:
-            depth_colored = (cmap(depth_uint8)[:, :, :3] * 255)[:, :, ::-1].astype(np.uint8)
+        colormap = 'gray' if DEPTH_CONFIG['grayscale'] else DEPTH_CONFIG['colormap']
+        depth_colored = colorize_depth(depth_uint8, colormap)
         
         if DEPTH_CONFIG['pred_only']:
             result = depth_colored
@@ -138,61 +197,229 @@ def create_depth_visualization(raw_image, depth_uint8):
     except Exception as e:
         raise Exception(f"Error creating depth visualization: {e}")
 
-def extract_depth_at_midpoints(depth_map, midpoints):
-    """Extract depth values at specified midpoints"""
+def extract_depth_at_midpoints(depth_map, midpoints, original_shape=None):
+    """Extract depth values at specified midpoints, with robust statistics over each bbox
+    
+    Midpoints and boxes are in original_shape pixels, for depth maps of images
+    decoded at reduced resolution.
+    """
     try:
-        depth_values = []
-        h, w = depth_map.shape
+        if not midpoints:
+            return []
         
-        for midpoint in midpoints:
-            x, y = midpoint['x'], midpoint['y']
-            
-            # Ensure coordinates are within image bounds
-            x = max(0, min(x, w - 1))
-            y = max(0, min(y, h - 1))
-            
-            # Extract depth value at midpoint
-            depth_value = float(depth_map[y, x])
-            
-            depth_info = {
-                'x': x,
-                'y': y,
-                'depth_value': depth_value,
-                'class_name': midpoint.get('class_name', 'unknown'),
-                'confidence': midpoint.get('confidence', 0.0),
-                'bbox': midpoint.get('bbox', {})
-            }
-            
-            depth_values.append(depth_info)
-            
-        return depth_values
+        h, w = depth_map.shape
+        h0, w0 = original_shape or (h, w)
+        gain = (w / w0, h / h0) * 2  # original to depth map pixels
+        
+        # Ensure coordinates are within image bounds and read all midpoints at once
+        xs = np.clip(np.array([int(m['x']) for m in midpoints]), 0, w0 - 1)
+        ys = np.clip(np.array([int(m['y']) for m in midpoints]), 0, h0 - 1)
+        depth_values = depth_map[(ys * gain[1]).astype(int), (xs * gain[0]).astype(int)].astype(float)
+        
+        # Robust statistics for every midpoint that carries a bbox
+        has_box = [all(k in m.get('bbox', {}) for k in ('x1', 'y1', 'x2', 'y2')) for m in midpoints]
+        boxes = [[m['bbox'][k] * g for k, g in zip(('x1', 'y1', 'x2', 'y2'), gain)] for m, b in zip(midpoints, has_box) if b]
+        box_stats = iter(compute_box_depth_stats(depth_map, boxes))
+        
+        return [{
+            'x': int(x),
+            'y': int(y),
+            'depth_value': float(depth_value),
+            'class_name': midpoint.get('class_name', 'unknown'),
+            'confidence': midpoint.get('confidence', 0.0),
+            'bbox': midpoint.get('bbox', {}),
+            'box_depth': next(box_stats) if b else None
+        } for midpoint, x, y, depth_value, b in zip(midpoints, xs, ys, depth_values, has_box)]
         
     except Exception as e:
         raise Exception(f"Error extracting depth at midpoints: {e}")
 
+def compute_box_depth_stats(depth_map, boxes, grid=None, percentiles=None, trim=None):
+    """Median, trimmed mean, percentiles, mean and valid-pixel fraction of depth inside every box at once
+    
+    boxes is an (n, 4) sequence of x1, y1, x2, y2 pixel coordinates. Mean and valid fraction are exact
+    (summed-area tables); median, percentiles and trimmed mean use a fixed grid x grid sample of each
+    box, so the cost per box is constant whatever its size.
+    """
+    grid = grid or DEPTH_CONFIG['box_grid']
+    percentiles = list(percentiles if percentiles is not None else DEPTH_CONFIG['box_percentiles'])
+    trim = DEPTH_CONFIG['box_trim'] if trim is None else trim
+    
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return []
+    
+    h, w = depth_map.shape
+    x1 = np.clip(np.floor(boxes[:, 0]), 0, w - 1).astype(np.int64)
+    y1 = np.clip(np.floor(boxes[:, 1]), 0, h - 1).astype(np.int64)
+    x2 = np.clip(np.ceil(boxes[:, 2]), x1 + 1, w).astype(np.int64)  # exclusive, at least one pixel
+    y2 = np.clip(np.ceil(boxes[:, 3]), y1 + 1, h).astype(np.int64)
+    
+    # Exact sums over each box from summed-area tables of valid depth and valid count
+    valid = np.isfinite(depth_map) & (depth_map > 0)
+    depth_valid = np.where(valid, depth_map, 0).astype(np.float64)
+    sat = np.zeros((2, h + 1, w + 1))
+    sat[0, 1:, 1:] = depth_valid.cumsum(0).cumsum(1)
+    sat[1, 1:, 1:] = valid.cumsum(0).cumsum(1)
+    sums = sat[:, y2, x2] - sat[:, y1, x2] - sat[:, y2, x1] + sat[:, y1, x1]
+    area = (x2 - x1) * (y2 - y1)
+    valid_count = sums[1]
+    
+    # Fixed grid of samples at pixel centres inside each box, invalid pixels as NaN
+    t = (np.arange(grid) + 0.5) / grid
+    sx = (x1[:, None] + t[None] * (x2 - x1)[:, None]).astype(np.int64)
+    sy = (y1[:, None] + t[None] * (y2 - y1)[:, None]).astype(np.int64)
+    samples = np.where(valid, depth_map, np.nan)[sy[:, :, None], sx[:, None, :]].reshape(len(boxes), -1)
+    
+    # Sort once: NaNs go last, so each row's valid samples are its first k entries
+    samples = np.sort(samples, axis=1)
+    k = np.isfinite(samples).sum(axis=1)
+    cut = np.floor(k * trim).astype(np.int64)
+    idx = np.arange(samples.shape[1])[None]
+    keep = (idx >= cut[:, None]) & (idx < (k - cut)[:, None])
+    
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)  # boxes without any valid pixel
+        quantiles = np.nanpercentile(samples, [50] + percentiles, axis=1)
+        trimmed = np.where(keep, samples, 0).sum(axis=1) / keep.sum(axis=1)
+        mean = sums[0] / valid_count
+    
+    def value(v):
+        return float(v) if np.isfinite(v) else None
+    
+    return [{
+        'median': value(quantiles[0, i]),
+        'trimmed_mean': value(trimmed[i]),
+        'mean': value(mean[i]),
+        'percentiles': {f'p{p}': value(quantiles[j + 1, i]) for j, p in enumerate(percentiles)},
+        'valid_fraction': float(valid_count[i] / area[i])
+    } for i in range(len(boxes))]
+
+def compute_depth_stats(depth_map):
+    """Summary statistics over the whole depth map"""
+    return {
+        'min_depth': float(depth_map.min()),
+        'max_depth': float(depth_map.max()),
+        'mean_depth': float(depth_map.mean()),
+        'std_depth': float(depth_map.std())
+    }
+
 def encode_image_to_base64(img_array):
     """Convert image array to base64 string"""
     try:
-        # Convert BGR to RGB if needed
-        if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-            img_rgb = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
-        else:
-            img_rgb = img_array
-            
-        img_pil = Image.fromarray(img_rgb)
-        
-        # Save to bytes buffer
-        buffer = io.BytesIO()
-        img_pil.save(buffer, format='JPEG', quality=90)
-        img_bytes = buffer.getvalue()
+        # Encode straight from the BGR (or grayscale) buffer
+        codec = DEPTH_CONFIG['image_codec']
+        img_bytes = encode_image(img_array, codec, DEPTH_CONFIG['image_quality'])
         
         # Encode to base64
         img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-        return f"data:image/jpeg;base64,{img_base64}"
+        return f"data:{IMAGE_CODECS[codec][1]};base64,{img_base64}"
         
     except Exception as e:
         raise Exception(f"Error encoding image: {e}")
 
+def encode_bytes_to_base64(data, mime='application/octet-stream'):
+    """Convert a binary payload to a base64 data URL"""
+    return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+def parse_depth_options(form):
+    """Parse the optional form fields of a depth request, raising ValueError on bad input"""
+    midpoints_json = form.get('midpoints', '[]')
+    try:
+        midpoints = json.loads(midpoints_json)
+    except json.JSONDecodeError:
+        raise ValueError('Invalid midpoints JSON data')
+    
+    image_info_json = form.get('image_info', '{}')
+    try:
+        image_info = json.loads(image_info_json)
+    except json.JSONDecodeError:
+        image_info = {}
+    
+    # Raw depth map output: 'float16' or 'uint16' (quantized), off by default
+    depth_output = None
+    depth_format = form.get('depth_format', 'none').lower()
+    if depth_format != 'none':
+        try:
+            downsample = int(form.get('depth_downsample', 1))
+        except ValueError:
+            raise ValueError('depth_downsample must be an integer')
+        compression = form.get('depth_compression', DEPTH_CONFIG['depth_compression']).lower()
+        if depth_format not in DEPTH_DTYPES:
+            raise ValueError(f'Invalid depth_format. Use none, {", ".join(DEPTH_DTYPES)}')
+        if compression not in DEPTH_COMPRESSIONS or (compression == 'zstd' and zstandard is None):
+            available = [c for c in DEPTH_COMPRESSIONS if c != 'zstd' or zstandard is not None]
+            raise ValueError(f'Invalid depth_compression. Available: {", ".join(available)}')
+        if not 1 <= downsample <= 255:
+            raise ValueError('depth_downsample must be between 1 and 255')
+        depth_output = {'dtype': depth_format, 'compression': compression, 'downsample': downsample}
+    
+    return {
+        'midpoints': midpoints,
+        'detection_count': int(form.get('detection_count', 0)),
+        'image_info': image_info,
+        'include_images': form.get('include_images', 'true').lower() == 'true',
+        'depth_output': depth_output
+    }
+
+def predict_depth_image(image_file, filename, midpoints, detection_count=0, image_info=None, include_images=True,
+                        depth_output=None, encode=encode_image_to_base64, encode_bytes=encode_bytes_to_base64):
+    """Run the full depth pipeline on one uploaded image and build the response"""
+    image_info = image_info or {}
+    
+    # Preprocess image
+    image_bytes = image_file.read()
+    img_bgr, original_shape = preprocess_image(image_bytes)
+    
+    # Estimate depth (or reuse the result for an identical upload)
+    depth_map, depth_uint8 = cached_estimate_depth(image_bytes, img_bgr)
+    
+    # Create depth visualization
+    depth_viz, depth_colored = create_depth_visualization(img_bgr, depth_uint8)
+    
+    # Extract depth values at midpoints
+    depth_at_midpoints = extract_depth_at_midpoints(depth_map, midpoints, original_shape)
+    
+    # Calculate statistics
+    depth_stats = compute_depth_stats(depth_map)
+    
+    # Prepare response
+    response_data = {
+        'success': True,
+        'timestamp': datetime.now().isoformat(),
+        'model_info': {
+            'encoder': DEPTH_CONFIG['encoder'],
+            'input_size': DEPTH_CONFIG['input_size'],
+            'device': str(device)
+        },
+        'image_info': {
+            'filename': filename,
+            'original_size': original_shape,  # (height, width)
+            'processed_size': img_bgr.shape[:2],
+            **image_info
+        },
+        'detection_info': {
+            'detection_count': detection_count,
+            'midpoints_processed': len(midpoints)
+        },
+        'depth_stats': depth_stats,
+        'depth_at_objects': depth_at_midpoints
+    }
+    
+    # Include the raw depth map if requested
+    if depth_output is not None:
+        depth_bytes, depth_info = encode_depth_map(depth_map, **depth_output)
+        response_data['depth_map'] = {**depth_info, 'data': encode_bytes(depth_bytes)}
+    
+    # Include images if requested
+    if include_images:
+        response_data['images'] = {
+            'depth_visualization': encode(depth_viz),
+            'depth_colored': encode(depth_colored)
+        }
+    
+    return response_data
+
 @app.route('/depth/predict_depth', methods=['POST'])
 def predict_depth():
     """Main endpoint for depth prediction with object midpoints"""
@@ -217,73 +444,29 @@ def predict_depth():
                 'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
             }), 400
         
-        # Get midpoints data
-        midpoints_json = request.form.get('midpoints', '[]')
-        try:
-            midpoints = json.loads(midpoints_json)
-        except json.JSONDecodeError:
-            return jsonify({'error': 'Invalid midpoints JSON data'}), 400
-        
-        # Get additional data
-        detection_count = int(request.form.get('detection_count', 0))
-        image_info_json = request.form.get('image_info', '{}')
+        # Get midpoints and additional data
         try:
-            image_info = json.loads(image_info_json)
-        except json.JSONDecodeError:
-            image_info = {}
+            options = parse_depth_options(request.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Reset file pointer to beginning
         file.seek(0)
         
-        # Preprocess image
-        img_bgr, img_rgb = preprocess_image(file)
-        
-        # Estimate depth
-        depth_map, depth_uint8 = estimate_depth(img_bgr)
-        
-        # Create depth visualization
-        depth_viz, depth_colored = create_depth_visualization(img_bgr, depth_uint8)
-        
-        # Extract depth values at midpoints
-        depth_at_midpoints = extract_depth_at_midpoints(depth_map, midpoints)
-        
-        # Calculate statistics
-        depth_stats = {
-            'min_depth': float(depth_map.min()),
-            'max_depth': float(depth_map.max()),
-            'mean_depth': float(depth_map.mean()),
-            'std_depth': float(depth_map.std())
-        }
+        # Binary (multipart) or JSON response
+        try:
+            image_parts = image_parts_from_form(request.form, DEPTH_CONFIG['image_codec'], DEPTH_CONFIG['image_quality'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Prepare response
-        response_data = {
-            'success': True,
-            'timestamp': datetime.now().isoformat(),
-            'model_info': {
-                'encoder': DEPTH_CONFIG['encoder'],
-                'input_size': DEPTH_CONFIG['input_size'],
-                'device': str(device)
-            },
-            'image_info': {
-                'filename': file.filename,
-                'original_size': img_bgr.shape[:2],  # (height, width)
-                **image_info
-            },
-            'detection_info': {
-                'detection_count': detection_count,
-                'midpoints_processed': len(midpoints)
-            },
-            'depth_stats': depth_stats,
-            'depth_at_objects': depth_at_midpoints
-        }
+        # Run depth pipeline
+        if image_parts is not None:
+            response_data = predict_depth_image(file, file.filename, encode=image_parts,
+                                                encode_bytes=image_parts.add_bytes, **options)
+            body, content_type = image_parts.multipart(response_data)
+            return Response(body, content_type=content_type), 200
         
-        # Include images if requested
-        include_images = request.form.get('include_images', 'true').lower() == 'true'
-        if include_images:
-            response_data['images'] = {
-                'depth_visualization': encode_image_to_base64(depth_viz),
-                'depth_colored': encode_image_to_base64(depth_colored)
-            }
+        response_data = predict_depth_image(file, file.filename, **options)
         
         return jsonify(response_data), 200
         
@@ -292,29 +475,39 @@ def predict_depth():
         traceback.print_exc()
         return jsonify({'error': f'Depth prediction failed: {str(e)}'}), 500
 
+def model_info_payload():
+    """Information about the loaded depth model"""
+    return {
+        'model_loaded': True,
+        'device': str(device),
+        'config': DEPTH_CONFIG,
+        'checkpoint_exists': os.path.exists(DEPTH_CONFIG['checkpoint_path']),
+        'batching': depth_batcher.stats() if depth_batcher is not None else None,
+        'cache': result_cache.stats() if result_cache is not None else None
+    }
+
+def health_payload(message):
+    """Health check information"""
+    return {
+        'status': 'healthy',
+        'message': message,
+        'model_loaded': depth_model is not None,
+        'allowed_extensions': list(ALLOWED_EXTENSIONS),
+        'max_file_size_mb': MAX_FILE_SIZE // (1024 * 1024)
+    }
+
 @app.route('/model-info', methods=['GET'])
 def model_info():
     """Get information about the loaded depth model"""
     if depth_model is None:
         return jsonify({'error': 'Model not loaded'}), 500
     
-    return jsonify({
-        'model_loaded': True,
-        'device': str(device),
-        'config': DEPTH_CONFIG,
-        'checkpoint_exists': os.path.exists(DEPTH_CONFIG['checkpoint_path'])
-    }), 200
+    return jsonify(model_info_payload()), 200
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'message': 'Flask Depth Anything V2 API is running',
-        'model_loaded': depth_model is not None,
-        'allowed_extensions': list(ALLOWED_EXTENSIONS),
-        'max_file_size_mb': MAX_FILE_SIZE // (1024 * 1024)
-    }), 200
+    return jsonify(health_payload('Flask Depth Anything V2 API is running')), 200
 
 
 @app.errorhandler(413)
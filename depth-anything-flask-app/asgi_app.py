@@ -0,0 +1,205 @@
+"""
+Async (ASGI) variant of the Depth Anything V2 API
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5050
+
+Multipart uploads are streamed and parsed on the event loop, so slow clients
+only hold a cheap coroutine. Decode and inference run on a bounded thread pool,
+and requests beyond its queue limit are refused with 503 and Retry-After.
+"""
+
+import asyncio
+import contextlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import app as depth_app  # also puts the YOLOv5 app's serving package on sys.path
+from app import ALLOWED_EXTENSIONS, DEPTH_CONFIG, MAX_FILE_SIZE, allowed_file
+from serving.responses import image_parts_from_form
+
+ASYNC_CONFIG = {
+    'executor_workers': 4,  # Threads running decode + inference (>= max_batch_size so batches can fill)
+    'max_pending': 16,  # Requests running or waiting for a thread before 503
+    'retry_after_s': 1,  # Retry-After header value on 503
+}
+
+
+class QueueFullError(Exception):
+    """Raised when the executor has no room for more work"""
+
+
+class BoundedExecutor:
+    """Thread pool that refuses work once `max_pending` jobs are running or queued"""
+
+    def __init__(self, max_workers, max_pending):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='inference')
+        self.max_pending = max_pending
+        self.pending = 0  # only touched from the event loop thread
+
+    async def run(self, fn, *args, **kwargs):
+        if self.pending >= self.max_pending:
+            raise QueueFullError()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+executor = BoundedExecutor(ASYNC_CONFIG['executor_workers'], ASYNC_CONFIG['max_pending'])
+
+
+class BodyTooLargeError(Exception):
+    """Raised when a request body grows past MAX_FILE_SIZE"""
+
+
+def declared_length(request):
+    """Content-Length of the request, None if absent; raises ValueError when malformed"""
+    value = request.headers.get('content-length')
+    if value is None:
+        return None
+    length = int(value)
+    if length < 0:
+        raise ValueError(value)
+    return length
+
+
+def size_limited(request, max_size):
+    """Request whose body raises BodyTooLargeError once more than max_size bytes arrive (chunked uploads included)"""
+    receive, received = request.receive, 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > max_size:
+                raise BodyTooLargeError()
+        return message
+
+    return Request(request.scope, limited_receive)
+
+
+def check_text_fields(form):
+    """Raise ValueError if a field other than the image upload was sent as a file part"""
+    for key, value in form.multi_items():
+        if key != 'image' and not isinstance(value, str):
+            raise ValueError(f'{key} must be a text field')
+
+
+def too_large_response():
+    return JSONResponse({'error': f'File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB'}, status_code=413)
+
+
+def busy_response():
+    return JSONResponse(
+        {'error': 'Server busy, please retry'},
+        status_code=503,
+        headers={'Retry-After': str(ASYNC_CONFIG['retry_after_s'])}
+    )
+
+
+async def predict_depth(request):
+    """Async endpoint for depth prediction with object midpoints"""
+    if depth_app.depth_model is None:
+        return JSONResponse({'error': 'Depth model not loaded'}, status_code=500)
+
+    # Refuse early, before reading the body
+    if executor.pending >= executor.max_pending:
+        return busy_response()
+    try:
+        length = declared_length(request)
+    except ValueError:
+        return JSONResponse({'error': 'Invalid Content-Length header'}, status_code=400)
+    if length is not None and length > MAX_FILE_SIZE:
+        return too_large_response()
+
+    try:
+        form = await size_limited(request, MAX_FILE_SIZE).form()
+    except BodyTooLargeError:
+        return too_large_response()
+    except Exception as e:
+        return JSONResponse({'error': f'Invalid multipart upload: {e}'}, status_code=400)
+
+    try:
+        file = form.get('image')
+        if file is None or not hasattr(file, 'filename'):
+            return JSONResponse({'error': 'No image file provided'}, status_code=400)
+        if file.filename == '':
+            return JSONResponse({'error': 'No file selected'}, status_code=400)
+        if not allowed_file(file.filename):
+            return JSONResponse({
+                'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+            }, status_code=400)
+
+        try:
+            check_text_fields(form)
+            options = depth_app.parse_depth_options(form)
+            image_parts = image_parts_from_form(form, DEPTH_CONFIG['image_codec'], DEPTH_CONFIG['image_quality'])
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+
+        encoders = {'encode': image_parts, 'encode_bytes': image_parts.add_bytes} if image_parts is not None else {}
+        await file.seek(0)
+        response_data = await executor.run(depth_app.predict_depth_image, file.file, file.filename, **encoders, **options)
+        if image_parts is not None:
+            body, content_type = image_parts.multipart(response_data)
+            return Response(body, media_type=content_type)
+        return JSONResponse(response_data)
+
+    except QueueFullError:
+        return busy_response()
+    except Exception as e:
+        print(f"Error in depth prediction: {str(e)}")
+        return JSONResponse({'error': f'Depth prediction failed: {str(e)}'}, status_code=500)
+    finally:
+        await form.close()
+
+
+async def model_info(request):
+    """Get information about the loaded depth model"""
+    if depth_app.depth_model is None:
+        return JSONResponse({'error': 'Model not loaded'}, status_code=500)
+    return JSONResponse({**depth_app.model_info_payload(), 'async': {**ASYNC_CONFIG, 'pending': executor.pending}})
+
+
+async def health_check(request):
+    """Health check endpoint"""
+    return JSONResponse(depth_app.health_payload('Async Depth Anything V2 API is running'))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    print("Loading Depth Anything V2 model...")
+    if depth_app.depth_model is None and not await asyncio.get_running_loop().run_in_executor(None, depth_app.load_depth_model):
+        print("✗ Failed to load model - API will not work properly")
+    yield
+    executor.shutdown()
+
+
+app = Starlette(
+    routes=[
+        Route('/depth/predict_depth', predict_depth, methods=['POST']),
+        Route('/model-info', model_info, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=5050)
@@ -0,0 +1,66 @@
+"""
+Lookup-table colormaps for depth visualization
+
+Each colormap is a precomputed 256x3 uint8 BGR table, so colorizing a uint8
+depth image is a single table lookup and needs no matplotlib at runtime.
+Spectral/Spectral_r match matplotlib's colormaps of the same name (to within one
+level); the OpenCV colormaps (turbo, inferno, ...) are read from cv2 once.
+
+    from colormap import colorize_depth
+    depth_colored = colorize_depth(depth_uint8, 'Spectral_r')
+"""
+
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+# ColorBrewer "Spectral" control points (RGB), as used by matplotlib
+SPECTRAL_RGB = [
+    (158, 1, 66), (213, 62, 79), (244, 109, 67), (253, 174, 97), (254, 224, 139), (255, 255, 191),
+    (230, 245, 152), (171, 221, 164), (102, 194, 165), (50, 136, 189), (94, 79, 162),
+]
+
+OPENCV_COLORMAPS = {
+    'turbo': cv2.COLORMAP_TURBO,
+    'inferno': cv2.COLORMAP_INFERNO,
+    'magma': cv2.COLORMAP_MAGMA,
+    'plasma': cv2.COLORMAP_PLASMA,
+    'viridis': cv2.COLORMAP_VIRIDIS,
+    'jet': cv2.COLORMAP_JET,
+}
+
+COLORMAPS = ['Spectral_r', 'Spectral', 'gray'] + list(OPENCV_COLORMAPS)
+
+
+def _linear_segmented_lut(control_points, reverse=False):
+    """256-entry RGB table linearly interpolated between equally spaced control points"""
+    anchors = np.asarray(control_points, dtype=np.float64) / 255.0
+    x = np.linspace(0.0, 1.0, 256)
+    xp = np.linspace(0.0, 1.0, len(anchors))
+    if reverse:  # mirror the segments (as matplotlib's *_r maps do) rather than flipping the table
+        anchors, xp = anchors[::-1], 1.0 - xp[::-1]
+    rgb = np.stack([np.interp(x, xp, anchors[:, c]) for c in range(3)], axis=-1)
+    return (rgb * 255).astype(np.uint8)  # truncate, like (cmap(depth)[:, :, :3] * 255).astype(np.uint8)
+
+
+@lru_cache(maxsize=None)
+def get_colormap_lut(name='Spectral_r'):
+    """256x3 uint8 BGR lookup table for a colormap name in COLORMAPS"""
+    if name in ('Spectral', 'Spectral_r'):
+        lut = _linear_segmented_lut(SPECTRAL_RGB, reverse=name == 'Spectral_r')[:, ::-1]  # RGB to BGR
+    elif name == 'gray':
+        lut = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+    elif name in OPENCV_COLORMAPS:
+        lut = cv2.applyColorMap(np.arange(256, dtype=np.uint8)[:, None], OPENCV_COLORMAPS[name])[:, 0]
+    else:
+        raise ValueError(f'Unknown colormap: {name}. Available: {", ".join(COLORMAPS)}')
+
+    lut = np.ascontiguousarray(lut)
+    lut.flags.writeable = False  # shared between threads
+    return lut
+
+
+def colorize_depth(depth_uint8, name='Spectral_r'):
+    """Map a uint8 depth image to a BGR image with one table lookup"""
+    return get_colormap_lut(name)[depth_uint8]
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import torch
+
+from .dpt import DepthAnythingV2
+
+
+MODEL_CONFIGS = {
+    'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
+    'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
+    'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]},
+    'vitg': {'encoder': 'vitg', 'features': 384, 'out_channels': [1536, 1536, 1536, 1536]}
+}
+
+
+class DepthMultiBackend:
+    # Depth Anything V2 on PyTorch, ONNX Runtime or OpenVINO, with the DepthAnythingV2 inference API
+    # (infer_image, infer_batch, infer_tiled, infer_tensors, image2tensor):
+    #   PyTorch:       weights = *.pth
+    #   ONNX Runtime:            *.onnx
+    #   OpenVINO:                *_openvino_model (or its *.xml)
+    # ONNX and OpenVINO models come from export.py.
+
+    def __init__(self, weights, encoder='vits', device='cpu'):
+        w = Path(weights)
+        self.weights = str(w)
+        self.encoder = encoder
+        self.device = device
+        self.pt = w.suffix == '.pth'
+        self.onnx = w.suffix == '.onnx'
+        self.xml = w.suffix == '.xml' or w.name.endswith('_openvino_model')
+
+        if self.pt:
+            model = DepthAnythingV2(**MODEL_CONFIGS[encoder])
+            model.load_state_dict(torch.load(w, map_location='cpu'))
+            self.model = model.to(device).eval()
+        elif self.onnx:
+            import onnxruntime as ort
+
+            providers = ['CPUExecutionProvider']
+            if str(device).startswith('cuda') and 'CUDAExecutionProvider' in ort.get_available_providers():
+                providers.insert(0, 'CUDAExecutionProvider')
+            self.session = ort.InferenceSession(str(w), providers=providers)
+            self.input_name = self.session.get_inputs()[0].name
+        elif self.xml:
+            import openvino as ov
+
+            if w.is_dir():
+                w = next(w.glob('*.xml'))  # model directory from export.py
+            core = ov.Core()
+            self.ov_model = core.compile_model(core.read_model(w), 'GPU' if str(device).startswith('cuda') else 'CPU')
+        else:
+            raise ValueError(f'Unsupported depth model format: {weights}. Use *.pth, *.onnx or *_openvino_model')
+
+    def run(self, x):
+        # Forward pass on a (b, 3, h, w) input tensor, returns a (b, h, w) depth tensor on the input device
+        if self.pt:
+            return self.model.run(x)
+
+        im = x.cpu().numpy()
+        if self.onnx:
+            y = self.session.run(None, {self.input_name: im})[0]
+        else:
+            y = self.ov_model(im)[self.ov_model.output(0)]
+        return torch.from_numpy(y).to(x.device)
+
+    def optimize(self, *args, **kwargs):
+        # torch.compile / TorchScript freeze (see DepthAnythingV2.optimize); exported models are already compiled
+        if self.pt:
+            self.model.optimize(*args, **kwargs)
+        return self
+
+    # Same preprocessing, batching and postprocessing as the PyTorch model, on top of run()
+    image2tensor = DepthAnythingV2.image2tensor
+    infer_image = DepthAnythingV2.infer_image
+    infer_batch = DepthAnythingV2.infer_batch
+    infer_tiled = DepthAnythingV2.infer_tiled
+    infer_tensors = DepthAnythingV2.infer_tensors
@@ -34,6 +34,23 @@ def named_apply(fn: Callable, module: nn.Module, name="", depth_first=True, incl
     return module
 
 
+def bicubic_weights(size, in_size, scale):
+    # (size, in_size) matrix of 1-D bicubic resampling by `scale` as nn.functional.interpolate computes it (A=-0.75,
+    # align_corners=False, edge pixels repeated, no antialiasing), from tensor ops only so exported sizes stay dynamic
+    x = (torch.arange(size, dtype=torch.float32) + 0.5) / scale - 0.5
+    i = x.floor()
+    t = x - i
+    A = -0.75
+    coeffs = (
+        ((A * (t + 1) - 5 * A) * (t + 1) + 8 * A) * (t + 1) - 4 * A,
+        ((A + 2) * t - (A + 3)) * t * t + 1,
+        ((A + 2) * (1 - t) - (A + 3)) * (1 - t) * (1 - t) + 1,
+        ((A * (2 - t) - 5 * A) * (2 - t) + 8 * A) * (2 - t) - 4 * A,
+    )
+    cols = torch.arange(in_size, dtype=torch.float32)
+    return sum(c[:, None] * (cols[None, :] == (i + k).clamp(0, in_size - 1)[:, None]) for k, c in zip((-1, 0, 1, 2), coeffs))
+
+
 class BlockChunk(nn.ModuleList):
     def forward(self, x):
         for b in self:
@@ -180,7 +197,7 @@ class DinoVisionTransformer(nn.Module):
         previous_dtype = x.dtype
         npatch = x.shape[1] - 1
         N = self.pos_embed.shape[1] - 1
-        if npatch == N and w == h:
+        if npatch == N and w == h and not torch.onnx.is_in_onnx_export():
             return self.pos_embed
         pos_embed = self.pos_embed.float()
         class_pos_embed = pos_embed[:, 0]
@@ -188,6 +205,19 @@ class DinoVisionTransformer(nn.Module):
         dim = x.shape[-1]
         w0 = w // self.patch_size
         h0 = h // self.patch_size
+        if torch.onnx.is_in_onnx_export():
+            # Python floats would fix the exported graph to the traced size: resample with bicubic weight matrices built
+            # from the (dynamic) patch grid instead, at the same coordinates as the interpolation below
+            assert not self.interpolate_antialias, "antialiased position embeddings cannot be exported"
+            sqrt_N = int(math.sqrt(N))
+            patch_pos_embed = patch_pos_embed.reshape(sqrt_N, sqrt_N, dim)
+            w0, h0 = torch.as_tensor(w0), torch.as_tensor(h0)
+            offset = self.interpolate_offset * ((w0 != sqrt_N) | (h0 != sqrt_N))  # none on the native grid, see above
+            mw = bicubic_weights(w0, sqrt_N, (w0 + offset) / sqrt_N)
+            mh = bicubic_weights(h0, sqrt_N, (h0 + offset) / sqrt_N)
+            patch_pos_embed = torch.matmul(mh, torch.matmul(mw, patch_pos_embed.reshape(sqrt_N, -1)).reshape(-1, sqrt_N, dim))
+            patch_pos_embed = patch_pos_embed.reshape(1, -1, dim)
+            return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1).to(previous_dtype)
         # we add a small number to avoid floating point error in the interpolation
         # see discussion at https://github.com/facebookresearch/dino/issues/8
         # DINOv2 with register modify the interpolate_offset from 0.1 to 0.0
@@ -277,6 +307,8 @@ class DinoVisionTransformer(nn.Module):
             x = blk(x)
             if i in blocks_to_take:
                 output.append(x)
+                if len(output) == len(blocks_to_take):
+                    break  # no block after the last one taken contributes
         assert len(output) == len(blocks_to_take), f"only {len(output)} / {len(blocks_to_take)} blocks found"
         return output
 
@@ -291,6 +323,8 @@ class DinoVisionTransformer(nn.Module):
                 if i in blocks_to_take:
                     output.append(x)
                 i += 1
+            if len(output) == len(blocks_to_take):
+                break  # no block after the last one taken contributes
         assert len(output) == len(blocks_to_take), f"only {len(output)} / {len(blocks_to_take)} blocks found"
         return output
 
@@ -9,9 +9,11 @@
 #   https://github.com/rwightman/pytorch-image-models/tree/master/timm/models/vision_transformer.py
 
 import logging
+import os
 
 from torch import Tensor
 from torch import nn
+import torch.nn.functional as F
 
 
 logger = logging.getLogger("dinov2")
@@ -26,6 +28,26 @@ except ImportError:
     XFORMERS_AVAILABLE = False
 
 
+# Attention implementation without xFormers, overridable per module (Attention.attn_impl):
+#   "sdpa": torch.nn.functional.scaled_dot_product_attention, fused kernels that do not
+#           materialize the N x N attention matrix where the backend supports it
+#   "math": explicit softmax(q @ k^T) @ v
+ATTENTION_IMPLS = ("sdpa", "math")
+
+
+def check_attn_impl(attn_impl: str) -> str:
+    if attn_impl not in ATTENTION_IMPLS:
+        raise ValueError(f"Invalid attention implementation {attn_impl!r}, use one of {ATTENTION_IMPLS}")
+    if attn_impl == "sdpa" and not hasattr(F, "scaled_dot_product_attention"):
+        raise ValueError("Attention implementation 'sdpa' requires torch>=2.0")
+    return attn_impl
+
+
+ATTENTION_IMPL = check_attn_impl(
+    os.environ.get("DINOV2_ATTENTION", "sdpa" if hasattr(F, "scaled_dot_product_attention") else "math")
+)
+
+
 class Attention(nn.Module):
     def __init__(
         self,
@@ -35,9 +57,11 @@ class Attention(nn.Module):
         proj_bias: bool = True,
         attn_drop: float = 0.0,
         proj_drop: float = 0.0,
+        attn_impl: str = None,
     ) -> None:
         super().__init__()
         self.num_heads = num_heads
+        self.attn_impl = check_attn_impl(attn_impl) if attn_impl else ATTENTION_IMPL
         head_dim = dim // num_heads
         self.scale = head_dim**-0.5
 
@@ -48,8 +72,17 @@ class Attention(nn.Module):
 
     def forward(self, x: Tensor) -> Tensor:
         B, N, C = x.shape
+        # Fused qkv projection viewed as (3, B, heads, N, head_dim), no copies of q, k and v
         qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
 
+        if self.attn_impl == "sdpa":
+            dropout_p = self.attn_drop.p if self.training else 0.0
+            x = F.scaled_dot_product_attention(qkv[0], qkv[1], qkv[2], dropout_p=dropout_p)  # scales by head_dim**-0.5
+            x = x.transpose(1, 2).reshape(B, N, C)
+            x = self.proj(x)
+            x = self.proj_drop(x)
+            return x
+
         q, k, v = qkv[0] * self.scale, qkv[1], qkv[2]
         attn = q @ k.transpose(-2, -1)
 
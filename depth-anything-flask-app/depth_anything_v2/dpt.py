@@ -1,3 +1,10 @@
+import contextlib
+import hashlib
+import math
+import os
+import warnings
+from pathlib import Path
+
 import cv2
 import torch
 import torch.nn as nn
@@ -21,6 +28,35 @@ def _make_fusion_block(features, use_bn, size=None):
     )
 
 
+def image2tensor(raw_image, input_size=518):
+    # BGR image -> normalized (1, 3, H, W) tensor on the default device, sides multiples of 14; also returns (h, w)
+    transform = Compose([
+        Resize(
+            width=input_size,
+            height=input_size,
+            resize_target=False,
+            keep_aspect_ratio=True,
+            ensure_multiple_of=14,
+            resize_method='lower_bound',
+            image_interpolation_method=cv2.INTER_CUBIC,
+        ),
+        NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        PrepareForNet(),
+    ])
+
+    h, w = raw_image.shape[:2]
+
+    image = cv2.cvtColor(raw_image, cv2.COLOR_BGR2RGB) / 255.0
+
+    image = transform({'image': image})['image']
+    image = torch.from_numpy(image).unsqueeze(0)
+
+    DEVICE = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
+    image = image.to(DEVICE)
+
+    return image, (h, w)
+
+
 class ConvBlock(nn.Module):
     def __init__(self, in_feature, out_feature):
         super().__init__()
@@ -144,7 +180,7 @@ class DPTHead(nn.Module):
         path_1 = self.scratch.refinenet1(path_2, layer_1_rn)
         
         out = self.scratch.output_conv1(path_1)
-        out = F.interpolate(out, (int(patch_h * 14), int(patch_w * 14)), mode="bilinear", align_corners=True)
+        out = F.interpolate(out, (patch_h * 14, patch_w * 14), mode="bilinear", align_corners=True)
         out = self.scratch.output_conv2(out)
         
         return out
@@ -172,6 +208,8 @@ class DepthAnythingV2(nn.Module):
         self.pretrained = DINOv2(model_name=encoder)
         
         self.depth_head = DPTHead(self.pretrained.embed_dim, features, use_bn, out_channels=out_channels, use_clstoken=use_clstoken)
+        
+        self.compiled = {}  # input shape (None for any shape) -> compiled or frozen network, see optimize()
     
     def forward(self, x):
         patch_h, patch_w = x.shape[-2] // 14, x.shape[-1] // 14
@@ -187,35 +225,133 @@ class DepthAnythingV2(nn.Module):
     def infer_image(self, raw_image, input_size=518):
         image, (h, w) = self.image2tensor(raw_image, input_size)
         
-        depth = self.forward(image)
+        depth = self.run(image)
         
         depth = F.interpolate(depth[:, None], (h, w), mode="bilinear", align_corners=True)[0, 0]
         
         return depth.cpu().numpy()
-    
-    def image2tensor(self, raw_image, input_size=518):        
-        transform = Compose([
-            Resize(
-                width=input_size,
-                height=input_size,
-                resize_target=False,
-                keep_aspect_ratio=True,
-                ensure_multiple_of=14,
-                resize_method='lower_bound',
-                image_interpolation_method=cv2.INTER_CUBIC,
-            ),
-            NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-            PrepareForNet(),
-        ])
-        
+
+    @torch.no_grad()
+    def infer_batch(self, raw_images, input_size=518):
+        inputs = [self.image2tensor(raw_image, input_size) for raw_image in raw_images]
+
+        return self.infer_tensors(inputs)
+
+    @torch.no_grad()
+    def infer_tensors(self, inputs):
+        # inputs: list of (image, (h, w)) pairs from image2tensor; images whose padded
+        # size comes out the same are stacked into one forward pass
+        buckets = {}
+        for i, (image, _) in enumerate(inputs):
+            buckets.setdefault(tuple(image.shape[-2:]), []).append(i)
+
+        depths = [None] * len(inputs)
+        for indices in buckets.values():
+            depth = self.run(torch.cat([inputs[i][0] for i in indices]))
+
+            for j, i in enumerate(indices):
+                h, w = inputs[i][1]
+                depths[i] = F.interpolate(depth[j:j + 1, None], (h, w), mode="bilinear", align_corners=True)[0, 0].cpu().numpy()
+
+        return depths
+
+    @torch.no_grad()
+    def infer_tiled(self, raw_image, input_size=518, tile_size=None, overlap=0.25):
+        # Sliding-window inference for images much larger than input_size. Overlapping square tiles
+        # of tile_size pixels (default: half the short side) run at input_size in one batch. Each tile's
+        # relative depth is aligned (least-squares scale and shift) to a whole-image pass, and the tiles
+        # are blended with weights that fall off linearly across the overlap.
         h, w = raw_image.shape[:2]
+        tile_size = min(tile_size or max(input_size, min(h, w) // 2), h, w)
+        stride = max(1, int(tile_size * (1 - overlap)))
+        
+        def starts(length):
+            n = 1 if length <= tile_size else math.ceil((length - tile_size) / stride) + 1
+            return [round(i * (length - tile_size) / max(n - 1, 1)) for i in range(n)]
+        
+        boxes = [(y, x) for y in starts(h) for x in starts(w)]
+        if len(boxes) == 1:
+            return self.infer_image(raw_image, input_size)
+        
+        # Whole image at input_size: the scale reference for every tile
+        image, _ = self.image2tensor(raw_image, input_size)
+        coarse = self.run(image)
         
-        image = cv2.cvtColor(raw_image, cv2.COLOR_BGR2RGB) / 255.0
+        # All tiles are square, so they share one input shape and one forward pass
+        tiles = torch.cat([self.image2tensor(raw_image[y:y + tile_size, x:x + tile_size], input_size)[0] for y, x in boxes])
+        depth = self.run(tiles.to(image.device)).float()
+        n, th, tw = depth.shape
         
-        image = transform({'image': image})['image']
-        image = torch.from_numpy(image).unsqueeze(0)
+        # Whole-image depth resampled onto each tile's output grid
+        ys, xs = (torch.tensor(v, dtype=torch.float32, device=depth.device)[:, None] for v in zip(*boxes))
+        gy = (ys + (torch.arange(th, device=depth.device) + 0.5) * tile_size / th) / h * 2 - 1
+        gx = (xs + (torch.arange(tw, device=depth.device) + 0.5) * tile_size / tw) / w * 2 - 1
+        grid = torch.stack((gx[:, None, :].expand(n, th, tw), gy[:, :, None].expand(n, th, tw)), -1)
+        reference = F.grid_sample(coarse.float()[None].expand(n, -1, -1, -1), grid, mode='bilinear', padding_mode='border', align_corners=False)[:, 0]
         
-        DEVICE = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
-        image = image.to(DEVICE)
+        # Per-tile scale and shift onto the reference (non-negative scale, so flat tiles cannot flip)
+        t, r = depth.flatten(1), reference.flatten(1)
+        t = t - t.mean(1, keepdim=True)
+        scale = ((t * (r - r.mean(1, keepdim=True))).mean(1, keepdim=True) / t.pow(2).mean(1, keepdim=True).clamp(min=1e-12)).clamp(min=0)
+        depth = (t * scale + r.mean(1, keepdim=True)).view(n, th, tw)
         
-        return image, (h, w)
+        # Blend: weights ramp up from the tile border over the overlap width
+        def ramp(size):
+            i = torch.arange(size, device=depth.device, dtype=torch.float32)
+            return ((torch.minimum(i, size - 1 - i) + 1) / max(overlap * size, 1)).clamp(max=1)
+        
+        weight = torch.minimum(ramp(th)[:, None], ramp(tw)[None])
+        weight = F.interpolate(weight[None, None], (tile_size, tile_size), mode='bilinear', align_corners=False)[0, 0]
+        out, norm = depth.new_zeros(h, w), depth.new_zeros(h, w)
+        for (y, x), d in zip(boxes, depth):
+            d = F.interpolate(d[None, None], (tile_size, tile_size), mode='bilinear', align_corners=False)[0, 0]
+            out[y:y + tile_size, x:x + tile_size] += d * weight
+            norm[y:y + tile_size, x:x + tile_size] += weight
+        
+        return (out / norm).cpu().numpy()
+
+    def run(self, x):
+        # forward() through the compiled or frozen network for this input shape, when there is one
+        return self.compiled.get(tuple(x.shape), self.compiled.get(None, self.forward))(x)
+
+    @torch.no_grad()
+    def optimize(self, mode='compile', shapes=((1, 3, 518, 518),), cache_dir='compile_cache', tag=''):
+        # Compile or freeze the network for the given input shapes and warm each of them up.
+        # 'compile' uses torch.compile with the TorchInductor cache in cache_dir (any shape);
+        # 'freeze' traces and freezes one TorchScript module per shape and saves it to cache_dir,
+        # so restarts load it instead of tracing again. tag should identify the weights.
+        if mode in (None, '', 'eager'):
+            return self
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        param = next(self.parameters())
+
+        if mode == 'compile':
+            os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', str((cache_dir / 'inductor').resolve()))
+            with contextlib.suppress(Exception):  # persistent FX graph cache, default on in recent torch
+                torch._inductor.config.fx_graph_cache = True
+            self.compiled[None] = torch.compile(self)
+        elif mode == 'freeze':
+            for shape in map(tuple, shapes):
+                key = [self.encoder, tag, shape, param.device, param.dtype, torch.__version__]
+                f = cache_dir / f'depth_anything_v2_{self.encoder}-{hashlib.md5(str(key).encode()).hexdigest()[:16]}.torchscript'
+                if f.exists():
+                    self.compiled[shape] = torch.jit.load(str(f), map_location=param.device)
+                    continue
+                print(f'Freezing Depth Anything V2 ({self.encoder}) for input shape {shape}...')
+                with warnings.catch_warnings():
+                    warnings.filterwarnings('ignore', category=torch.jit.TracerWarning)
+                    ts = torch.jit.freeze(torch.jit.trace(self.eval(), torch.zeros(shape, dtype=param.dtype, device=param.device)))
+                torch.jit.save(ts, str(f))
+                self.compiled[shape] = ts
+        else:
+            raise ValueError(f"Invalid optimize mode {mode}, use 'compile' or 'freeze'")
+
+        # Warm up every shape (for 'compile' this is where compilation happens)
+        for shape in shapes:
+            for _ in range(2):
+                self.run(torch.zeros(tuple(shape), dtype=param.dtype, device=param.device))
+        return self
+
+    def image2tensor(self, raw_image, input_size=518):
+        return image2tensor(raw_image, input_size)
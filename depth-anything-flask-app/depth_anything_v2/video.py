@@ -0,0 +1,106 @@
+from collections import Counter, deque
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+class VideoDepthStream:
+    # Temporally consistent depth for a stream of video frames, with full network passes only on keyframes.
+    # Each frame is compared with the last keyframe (mean absolute difference of small grayscale
+    # thumbnails, 0-1):
+    #   change < skip_thres:     the previous depth map is reused, no network at all
+    #   change < refresh_thres:  cheap refresh, DINOv2 runs only up to the first refresh_layers of its
+    #                            intermediate layers, the deeper (slowly changing) ones come from the
+    #                            keyframe's cached get_intermediate_layers output
+    #   otherwise, or every keyframe_interval frames: new keyframe, full pass, features cached
+    # Depth is normalized to uint8 with percentiles averaged over the last `window` computed frames,
+    # so the colors do not flicker the way per-frame min/max normalization does.
+    # Keyframes of compiled/frozen models (optimize()) and of ONNX/OpenVINO backends go through
+    # model.run, so they keep their compiled graph. The partial refresh needs the eager network's
+    # intermediate layers, which those do not expose, so they refresh with a full keyframe pass instead.
+
+    def __init__(self, model, input_size=518, skip_thres=0.01, refresh_thres=0.04, refresh_layers=2,
+                 keyframe_interval=30, window=30, thumbnail_width=64):
+        self.model = model
+        self.net = getattr(model, 'model', model) if getattr(model, 'pt', True) else None  # DepthAnythingV2
+        self.input_size = input_size
+        self.skip_thres = skip_thres
+        self.refresh_thres = refresh_thres
+        self.refresh_layers = refresh_layers
+        self.keyframe_interval = keyframe_interval
+        self.thumbnail_width = thumbnail_width
+        self.ranges = deque(maxlen=window)
+        self.counts = Counter()
+        self.reset()
+
+    def reset(self):
+        # Start over, e.g. at a cut or a new video
+        self.keyframe = None  # thumbnail of the last keyframe
+        self.features = None  # its DINOv2 intermediate layers
+        self.shape = None  # its network input shape
+        self.age = 0  # frames since the last keyframe
+        self.depth = None  # last depth map and its uint8 version
+        self.depth_uint8 = None
+        self.ranges.clear()
+
+    def thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.thumbnail_width, max(1, round(h * self.thumbnail_width / w)))
+        return cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY).astype(np.float32) / 255
+
+    @torch.no_grad()
+    def __call__(self, frame):
+        # Returns (depth, depth_uint8, mode) for a BGR frame, mode is 'keyframe', 'refresh' or 'skip'
+        thumb = self.thumbnail(frame)
+        if self.keyframe is None or thumb.shape != self.keyframe.shape:
+            change = 1.0
+        else:
+            change = float(np.abs(thumb - self.keyframe).mean())
+        self.age += 1
+
+        if self.age >= self.keyframe_interval or change >= self.refresh_thres:
+            mode = 'keyframe'
+        elif change >= self.skip_thres:
+            mode = 'refresh'
+        else:
+            mode = 'skip'
+        if mode == 'skip':
+            self.counts[mode] += 1
+            return self.depth, self.depth_uint8, mode
+
+        image, (h, w) = self.model.image2tensor(frame, self.input_size)
+        net = self.net if self.net is not None and not self.net.compiled else None  # eager network, features reusable
+        if mode == 'refresh' and (net is None or self.features is None or tuple(image.shape) != self.shape):
+            mode = 'keyframe'  # no reusable features
+        self.counts[mode] += 1
+
+        if net is None:
+            depth = self.model.run(image)  # compiled graph or exported backend, full pass
+            self.features = None
+        else:
+            layers = net.intermediate_layer_idx[net.encoder]
+            if mode == 'keyframe':
+                features = net.pretrained.get_intermediate_layers(image, layers, return_class_token=True)
+            else:
+                # Shallow layers from this frame, deep layers from the keyframe
+                shallow = net.pretrained.get_intermediate_layers(image, layers[:self.refresh_layers], return_class_token=True)
+                features = tuple(shallow) + self.features[self.refresh_layers:]
+            patch_h, patch_w = image.shape[-2] // 14, image.shape[-1] // 14
+            depth = F.relu(net.depth_head(features, patch_h, patch_w)).squeeze(1)
+            if mode == 'keyframe':
+                self.features = features
+
+        if mode == 'keyframe':
+            self.keyframe, self.shape, self.age = thumb, tuple(image.shape), 0
+
+        depth = F.interpolate(depth[:, None], (h, w), mode="bilinear", align_corners=True)[0, 0].cpu().numpy()
+        self.depth, self.depth_uint8 = depth, self.normalize(depth)
+        return self.depth, self.depth_uint8, mode
+
+    def normalize(self, depth):
+        # uint8 depth scaled by the running-window mean of the 1st/99th percentiles
+        self.ranges.append(np.percentile(depth[::4, ::4], (1, 99)))
+        lo, hi = np.mean(self.ranges, axis=0)
+        return np.clip((depth - lo) / max(hi - lo, 1e-6) * 255.0, 0, 255).astype(np.uint8)
@@ -0,0 +1,104 @@
+"""
+Compact binary encoding of raw depth maps
+
+Layout (little-endian): a 24-byte header followed by the (optionally compressed)
+row-major depth payload.
+
+    offset  size  field
+    0       4     magic b'DPTH'
+    4       1     version (1)
+    5       1     dtype: 1 = float16, 2 = uint16 (quantized)
+    6       1     compression: 0 = none, 1 = deflate (zlib), 2 = zstd
+    7       1     downsample factor
+    8       4     height (uint32)
+    12      4     width (uint32)
+    16      4     scale (float32)
+    20      4     offset (float32)
+
+Depth is recovered as `value * scale + offset`; for float16 scale is 1 and offset 0.
+"""
+
+import struct
+import zlib
+
+import cv2
+import numpy as np
+
+try:
+    import zstandard  # optional, for 'zstd' compression
+except ImportError:
+    zstandard = None
+
+MAGIC = b'DPTH'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBIIff')
+
+DEPTH_DTYPES = {'float16': (1, '<f2'), 'uint16': (2, '<u2')}
+DEPTH_COMPRESSIONS = {'none': 0, 'deflate': 1, 'zstd': 2}
+
+
+def encode_depth_map(depth_map, dtype='float16', compression='deflate', downsample=1):
+    """Encode a float depth map, returns (bytes, info dict describing the header)"""
+    if dtype not in DEPTH_DTYPES:
+        raise ValueError(f'Invalid depth format: {dtype}. Supported: {", ".join(DEPTH_DTYPES)}')
+    if compression not in DEPTH_COMPRESSIONS:
+        raise ValueError(f'Invalid depth compression: {compression}. Supported: {", ".join(DEPTH_COMPRESSIONS)}')
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError('zstd compression requires the zstandard package')
+    downsample = int(downsample)
+    if not 1 <= downsample <= 255:
+        raise ValueError('Depth downsample factor must be between 1 and 255')
+
+    depth = depth_map.astype(np.float32, copy=False)
+    if downsample > 1:
+        h, w = depth.shape
+        depth = cv2.resize(depth, (max(1, w // downsample), max(1, h // downsample)), interpolation=cv2.INTER_AREA)
+    height, width = depth.shape
+
+    dtype_code, np_dtype = DEPTH_DTYPES[dtype]
+    if dtype == 'uint16':
+        # Linear quantization of [min, max] onto the full uint16 range
+        offset = float(depth.min())
+        scale = float(depth.max() - offset) / 65535.0 or 1.0
+        payload = np.round((depth - offset) / scale).astype(np_dtype)
+    else:
+        scale, offset = 1.0, 0.0
+        payload = depth.astype(np_dtype)
+    payload = payload.tobytes()
+
+    if compression == 'deflate':
+        payload = zlib.compress(payload, 6)
+    elif compression == 'zstd':
+        payload = zstandard.ZstdCompressor(level=3).compress(payload)
+
+    header = HEADER.pack(MAGIC, VERSION, dtype_code, DEPTH_COMPRESSIONS[compression], downsample, height, width, scale, offset)
+    info = {
+        'format': dtype,
+        'compression': compression,
+        'downsample': downsample,
+        'shape': [height, width],
+        'scale': scale,
+        'offset': offset,
+        'header_bytes': HEADER.size,
+        'bytes': HEADER.size + len(payload)
+    }
+    return header + payload, info
+
+
+def decode_depth_map(data):
+    """Decode bytes from encode_depth_map back into a float32 depth map"""
+    magic, version, dtype_code, compression, _, height, width, scale, offset = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a depth map payload')
+
+    payload = data[HEADER.size:]
+    if compression == DEPTH_COMPRESSIONS['deflate']:
+        payload = zlib.decompress(payload)
+    elif compression == DEPTH_COMPRESSIONS['zstd']:
+        if zstandard is None:
+            raise ValueError('zstd compression requires the zstandard package')
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+
+    np_dtype = next(t for code, t in DEPTH_DTYPES.values() if code == dtype_code)
+    depth = np.frombuffer(payload, dtype=np_dtype).reshape(height, width).astype(np.float32)
+    return depth * scale + offset if dtype_code == DEPTH_DTYPES['uint16'][0] else depth
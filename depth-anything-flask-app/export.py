@@ -0,0 +1,99 @@
+"""
+Export Depth Anything V2 to ONNX and OpenVINO IR
+
+The exported models take any (batch, 3, height, width) input with height and
+width multiples of 14 (what image2tensor produces) and return a
+(batch, height, width) relative depth map. Load them with
+depth_anything_v2.backend.DepthMultiBackend, or point DEPTH_CONFIG['checkpoint_path']
+/ run.py --weights at them.
+
+    python export.py --encoder vits --include onnx openvino
+"""
+
+import argparse
+import os
+import time
+import warnings
+
+import numpy as np
+import torch
+
+from depth_anything_v2.backend import MODEL_CONFIGS, DepthMultiBackend
+from depth_anything_v2.dpt import DepthAnythingV2
+
+
+def export_onnx(model, im, f, opset=17):
+    # Dynamic batch, height and width (DINOv2 position embeddings are resampled to the input's patch grid in the graph)
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', category=torch.jit.TracerWarning)
+        torch.onnx.export(
+            model,
+            im,
+            f,
+            opset_version=opset,
+            input_names=['image'],
+            output_names=['depth'],
+            dynamic_axes={'image': {0: 'batch', 2: 'height', 3: 'width'}, 'depth': {0: 'batch', 1: 'height', 2: 'width'}}
+        )
+    return f
+
+
+def export_openvino(f_onnx, f, half=False):
+    import openvino as ov
+
+    os.makedirs(f, exist_ok=True)
+    ov_model = ov.convert_model(f_onnx)
+    f_xml = os.path.join(f, os.path.splitext(os.path.basename(f_onnx))[0] + '.xml')
+    ov.save_model(ov_model, f_xml, compress_to_fp16=half)
+    return f
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Depth Anything V2 export')
+
+    parser.add_argument('--encoder', type=str, default='vits', choices=['vits', 'vitb', 'vitl', 'vitg'])
+    parser.add_argument('--checkpoint', type=str, default=None, help='default: checkpoints/depth_anything_v2_<encoder>.pth')
+    parser.add_argument('--input-size', type=int, default=518)
+    parser.add_argument('--include', nargs='+', default=['onnx'], choices=['onnx', 'openvino'])
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--half', action='store_true', help='FP16 OpenVINO weights')
+    parser.add_argument('--verify', action='store_true', help='compare exported and PyTorch outputs on random inputs')
+
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or f'checkpoints/depth_anything_v2_{args.encoder}.pth'
+
+    model = DepthAnythingV2(**MODEL_CONFIGS[args.encoder])
+    model.load_state_dict(torch.load(checkpoint, map_location='cpu'))
+    model = model.eval()
+
+    # Trace on a non-square input so no shape-specific shortcut ends up in the graph
+    h, w = args.input_size, args.input_size // 14 * 14 + 14 * 12
+    im = torch.zeros(1, 3, h, w)
+
+    f_onnx = os.path.splitext(checkpoint)[0] + '.onnx'
+    t = time.time()
+    export_onnx(model, im, f_onnx, args.opset)
+    print(f'ONNX: saved {f_onnx} ({os.path.getsize(f_onnx) / 1e6:.1f} MB, {time.time() - t:.1f}s)')
+    exported = [f_onnx]
+
+    if 'openvino' in args.include:
+        f_ov = os.path.splitext(checkpoint)[0] + '_openvino_model'
+        t = time.time()
+        export_openvino(f_onnx, f_ov, args.half)
+        print(f'OpenVINO: saved {f_ov} ({time.time() - t:.1f}s)')
+        exported.append(f_ov)
+
+    if args.verify:
+        # Other shapes than traced: square, landscape, portrait and smaller than the position embedding grid
+        s = args.input_size // 14 * 14
+        shapes = ((s, s), (s, s + 14 * 4), (s + 14 * 6, s), (s // 2 // 14 * 14, s // 2 // 14 * 14))
+        backends = {f: DepthMultiBackend(f, args.encoder) for f in exported}
+        for h, w in shapes:
+            x = torch.rand(2, 3, h, w)
+            with torch.no_grad():
+                expected = model(x).numpy()
+            for f, backend in backends.items():
+                depth = backend.run(x).numpy()
+                rel = np.abs(depth - expected).max() / (np.abs(expected).max() + 1e-6)
+                print(f'{f} {h}x{w}: output {depth.shape}, max relative difference to PyTorch {rel:.2e}')
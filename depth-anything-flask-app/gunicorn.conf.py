@@ -0,0 +1,14 @@
+"""
+Gunicorn settings for the production server
+
+Environment overrides:
+    PORT            listen port (default 5050)
+and WORKERS, THREADS, TIMEOUT, TORCH_THREADS, PIN_CPUS (see serving/gunicorn_config.py of the YOLOv5 app)
+"""
+
+import os
+
+import serving_path  # noqa: F401
+from serving.gunicorn_config import *  # noqa: F401,F403 workers, threads, preload_app and the CPU slot hooks
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5050')}"
@@ -0,0 +1,164 @@
+"""
+INT8 post-training quantization of Depth Anything V2 for CPU inference with ONNX Runtime
+
+Exports the model to ONNX (see export.py) if needed, calibrates activation
+ranges on a local image folder and writes a QDQ INT8 model next to it, e.g.
+checkpoints/depth_anything_v2_vits_int8.onnx. Point DEPTH_CONFIG['checkpoint_path']
+or run.py --weights at it to serve it. Conv and MatMul layers are quantized;
+normalization, softmax and the upsampling head stay in FP32.
+
+The INT8 model is then scored with metric_depth's eval_depth (abs_rel, d1):
+against the FP32 model's predictions, and against ground truth depth when
+--gt-dir holds <image name>.npy depth maps (predicted disparity is aligned to
+the ground truth with a least-squares scale and shift first).
+
+    pip install onnx onnxruntime
+    python quantize.py --encoder vits --calib-dir assets/examples
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from depth_anything_v2.backend import MODEL_CONFIGS, DepthMultiBackend
+from depth_anything_v2.dpt import DepthAnythingV2, image2tensor
+from export import export_onnx
+from metric_depth.util.metric import eval_depth
+
+IMG_FORMATS = ('.bmp', '.jpeg', '.jpg', '.png', '.tif', '.tiff', '.webp')
+
+
+class CalibrationReader:
+    # ONNX Runtime calibration data reader, one preprocessed image (as served) per call
+    def __init__(self, files, input_name, input_size=518):
+        self.files, self.input_name, self.input_size = files, input_name, input_size
+        self.rewind()
+
+    def get_next(self):
+        f = next(self.iter, None)
+        if f is None:
+            return None
+        image, _ = image2tensor(cv2.imread(f), self.input_size)
+        return {self.input_name: image.cpu().numpy()}
+
+    def rewind(self):
+        self.iter = iter(self.files)
+
+
+def quantize_onnx(f, f_int8, reader, method='minmax', per_channel=True):
+    import onnx  # noqa: F401, required by onnxruntime.quantization
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    f_pre = os.path.splitext(f)[0] + '-preprocessed.onnx'
+    quant_pre_process(f, f_pre)  # shape inference and graph optimization before quantizing
+    quantize_static(
+        f_pre,
+        f_int8,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        op_types_to_quantize=['Conv', 'MatMul'],
+        per_channel=per_channel,
+        calibrate_method={
+            'minmax': CalibrationMethod.MinMax,
+            'entropy': CalibrationMethod.Entropy,
+            'percentile': CalibrationMethod.Percentile
+        }[method]
+    )
+    os.remove(f_pre)
+    return f_int8
+
+
+def align_scale_shift(disparity, target_disparity):
+    # Least-squares scale and shift mapping relative disparity onto the target
+    A = torch.stack([disparity, torch.ones_like(disparity)], 1)
+    scale, shift = torch.linalg.lstsq(A, target_disparity[:, None]).solution[:, 0]
+    return disparity * scale + shift
+
+
+def evaluate(pred, target, min_value=1e-3):
+    # eval_depth on the pixels where both maps are positive (disparity is 0 at infinity)
+    pred, target = torch.from_numpy(pred).flatten().double(), torch.from_numpy(target).flatten().double()
+    valid = (pred > min_value * pred.max()) & (target > min_value * target.max())
+    return eval_depth(pred[valid], target[valid])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Depth Anything V2 INT8 quantization')
+
+    parser.add_argument('--encoder', type=str, default='vits', choices=['vits', 'vitb', 'vitl', 'vitg'])
+    parser.add_argument('--weights', type=str, default=None, help='*.pth or FP32 *.onnx (default: checkpoints/depth_anything_v2_<encoder>.pth)')
+    parser.add_argument('--calib-dir', type=str, required=True, help='calibration image folder')
+    parser.add_argument('--calib-images', type=int, default=100, help='max calibration images')
+    parser.add_argument('--eval-dir', type=str, default=None, help='evaluation image folder (default: calibration images)')
+    parser.add_argument('--gt-dir', type=str, default=None, help='ground truth depth maps <image name>.npy for the evaluation images')
+    parser.add_argument('--input-size', type=int, default=518)
+    parser.add_argument('--method', type=str, default='minmax', choices=['minmax', 'entropy', 'percentile'])
+    parser.add_argument('--per-tensor', action='store_true', help='per-tensor instead of per-channel weight scales')
+    parser.add_argument('--opset', type=int, default=17)
+
+    args = parser.parse_args()
+
+    def image_files(folder, limit=None):
+        files = sorted(f for f in glob.glob(os.path.join(folder, '**/*'), recursive=True) if f.lower().endswith(IMG_FORMATS))
+        assert files, f'No images found in {folder}'
+        return files[:limit]
+
+    calib_files = image_files(args.calib_dir, args.calib_images)
+    eval_files = image_files(args.eval_dir) if args.eval_dir else calib_files
+
+    # FP32 ONNX model with dynamic batch, height and width
+    weights = args.weights or f'checkpoints/depth_anything_v2_{args.encoder}.pth'
+    if weights.endswith('.onnx'):
+        f = weights
+    else:
+        model = DepthAnythingV2(**MODEL_CONFIGS[args.encoder])
+        model.load_state_dict(torch.load(weights, map_location='cpu'))
+        h, w = args.input_size, args.input_size // 14 * 14 + 14 * 12
+        f = export_onnx(model.eval(), torch.zeros(1, 3, h, w), os.path.splitext(weights)[0] + '.onnx', args.opset)
+        print(f'ONNX: saved {f}')
+
+    import onnx
+
+    t = time.time()
+    f_int8 = os.path.splitext(f)[0] + '_int8.onnx'
+    reader = CalibrationReader(calib_files, onnx.load(f).graph.input[0].name, args.input_size)
+    quantize_onnx(f, f_int8, reader, args.method, not args.per_tensor)
+    print(f'INT8: saved {f_int8} ({os.path.getsize(f_int8) / 1e6:.1f} MB, FP32 {os.path.getsize(f) / 1e6:.1f} MB, '
+          f'calibrated on {len(calib_files)} images in {time.time() - t:.1f}s)')
+
+    # Accuracy and CPU latency, FP32 vs INT8
+    fp32, int8 = DepthMultiBackend(f, args.encoder), DepthMultiBackend(f_int8, args.encoder)
+    results = {'INT8 vs FP32': [], 'FP32 vs GT': [], 'INT8 vs GT': []}
+    times = {'FP32': 0.0, 'INT8': 0.0}
+    for file in eval_files:
+        raw_image = cv2.imread(file)
+        depths = {}
+        for name, model in (('FP32', fp32), ('INT8', int8)):
+            t = time.perf_counter()
+            depths[name] = model.infer_image(raw_image, args.input_size)
+            times[name] += time.perf_counter() - t
+        results['INT8 vs FP32'].append(evaluate(depths['INT8'], depths['FP32']))
+
+        gt_file = args.gt_dir and os.path.join(args.gt_dir, os.path.splitext(os.path.basename(file))[0] + '.npy')
+        if gt_file and os.path.exists(gt_file):
+            gt = torch.from_numpy(np.load(gt_file)).double().flatten()
+            valid = gt > 0
+            for name in ('FP32', 'INT8'):
+                disparity = align_scale_shift(torch.from_numpy(depths[name]).double().flatten()[valid], 1 / gt[valid])
+                depth = 1 / disparity.clamp(min=1e-6)
+                results[f'{name} vs GT'].append(eval_depth(depth, gt[valid]))
+
+    print(f'\nEvaluated on {len(eval_files)} images')
+    print(f"{'':>14}{'abs_rel':>10}{'d1':>10}")
+    for name, metrics in results.items():
+        if metrics:
+            abs_rel, d1 = (np.mean([m[k] for m in metrics]) for k in ('abs_rel', 'd1'))
+            print(f'{name:>14}{abs_rel:>10.4f}{d1:>10.4f}')
+    for name, dt in times.items():
+        print(f'{name} {dt / len(eval_files) * 1e3:.1f} ms/image')
@@ -1,12 +1,12 @@
 import argparse
 import cv2
 import glob
-import matplotlib
 import numpy as np
 import os
 import torch
 
-from depth_anything_v2.dpt import DepthAnythingV2
+from colormap import COLORMAPS, colorize_depth
+from depth_anything_v2.backend import DepthMultiBackend
 
 
 if __name__ == '__main__':
@@ -17,24 +17,22 @@ if __name__ == '__main__':
     parser.add_argument('--outdir', type=str, default='./vis_depth')
     
     parser.add_argument('--encoder', type=str, default='vitl', choices=['vits', 'vitb', 'vitl', 'vitg'])
+    parser.add_argument('--weights', type=str, default=None, help='*.pth, *.onnx or *_openvino_model (default: checkpoints/depth_anything_v2_<encoder>.pth)')
+    
+    parser.add_argument('--tiled', action='store_true', help='sliding-window inference on overlapping tiles at full resolution')
+    parser.add_argument('--tile-size', type=int, default=None, help='tile side in pixels (default: half the short side)')
+    parser.add_argument('--tile-overlap', type=float, default=0.25)
     
     parser.add_argument('--pred-only', dest='pred_only', action='store_true', help='only display the prediction')
     parser.add_argument('--grayscale', dest='grayscale', action='store_true', help='do not apply colorful palette')
+    parser.add_argument('--colormap', type=str, default='Spectral_r', choices=COLORMAPS, help='palette for the depth map')
     
     args = parser.parse_args()
     
     DEVICE = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
     
-    model_configs = {
-        'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
-        'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
-        'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]},
-        'vitg': {'encoder': 'vitg', 'features': 384, 'out_channels': [1536, 1536, 1536, 1536]}
-    }
-    
-    depth_anything = DepthAnythingV2(**model_configs[args.encoder])
-    depth_anything.load_state_dict(torch.load(f'checkpoints/depth_anything_v2_{args.encoder}.pth', map_location='cpu'))
-    depth_anything = depth_anything.to(DEVICE).eval()
+    weights = args.weights or f'checkpoints/depth_anything_v2_{args.encoder}.pth'
+    depth_anything = DepthMultiBackend(weights, encoder=args.encoder, device=DEVICE)
     
     if os.path.isfile(args.img_path):
         if args.img_path.endswith('txt'):
@@ -47,22 +45,22 @@ if __name__ == '__main__':
     
     os.makedirs(args.outdir, exist_ok=True)
     
-    cmap = matplotlib.colormaps.get_cmap('Spectral_r')
+    colormap = 'gray' if args.grayscale else args.colormap
     
     for k, filename in enumerate(filenames):
         print(f'Progress {k+1}/{len(filenames)}: {filename}')
         
         raw_image = cv2.imread(filename)
         
-        depth = depth_anything.infer_image(raw_image, args.input_size)
+        if args.tiled:
+            depth = depth_anything.infer_tiled(raw_image, args.input_size, args.tile_size, args.tile_overlap)
+        else:
+            depth = depth_anything.infer_image(raw_image, args.input_size)
         
         depth = (depth - depth.min()) / (depth.max() - depth.min()) * 255.0
         depth = depth.astype(np.uint8)
         
-        if args.grayscale:
-            depth = np.repeat(depth[..., np.newaxis], 3, axis=-1)
-        else:
-            depth = (cmap(depth)[:, :, :3] * 255)[:, :, ::-1].astype(np.uint8)
+        depth = colorize_depth(depth, colormap)
         
         if args.pred_only:
             cv2.imwrite(os.path.join(args.outdir, os.path.splitext(os.path.basename(filename))[0] + '.png'), depth)
@@ -1,92 +1,233 @@
 import argparse
 import cv2
 import glob
-import matplotlib
 import numpy as np
 import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
 
-from depth_anything_v2.dpt import DepthAnythingV2
+from colormap import COLORMAPS, colorize_depth
+from depth_anything_v2.backend import DepthMultiBackend
+from depth_anything_v2.video import VideoDepthStream
+
+
+def load_video_decoder():
+    # utils/video_decode.py of the YOLOv5 app (OpenCV only) provides --decode-workers; serving_path appends that app
+    # to sys.path, so this app's own modules keep precedence and the decode worker processes find it by name
+    import serving_path  # noqa: F401
+    from utils.video_decode import VideoDecoder
+    return VideoDecoder
+
+
+class StageStats:
+    # Busy time and frame count per pipeline stage (shared by the stage threads)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.time = defaultdict(float)
+        self.frames = defaultdict(int)
+
+    def add(self, stage, dt, n=1):
+        with self.lock:
+            self.time[stage] += dt
+            self.frames[stage] += n
+
+    def report(self, wall_time, workers):
+        # FPS each stage could sustain on its own; the slowest one bounds the pipeline
+        parts = []
+        for stage in ('decode', 'infer', 'colorize', 'write'):
+            fps = self.frames[stage] / max(self.time[stage], 1e-9)
+            if stage == 'colorize':
+                parts.append(f'{stage} {fps * workers:.1f} ({workers} workers)')
+            else:
+                parts.append(f'{stage} {fps:.1f}')
+        return f"{self.frames['write']} frames at {self.frames['write'] / wall_time:.1f} FPS | stage FPS: " + ', '.join(parts)
+
+
+def read_frames(video, frames, stride, stats):
+    # Decode stage: every stride-th frame into the bounded queue, None once the video ends.
+    # A VideoDecoder strides (and decodes in parallel) itself; with a cv2.VideoCapture skipped
+    # frames are only grabbed, not converted to BGR.
+    try:
+        if not isinstance(video, cv2.VideoCapture):  # VideoDecoder
+            t = time.perf_counter()
+            for frame in video:
+                stats.add('decode', time.perf_counter() - t)
+                frames.put(frame)
+                t = time.perf_counter()
+            return
+        index = 0
+        while True:
+            t = time.perf_counter()
+            if not video.grab():
+                break
+            frame = video.retrieve()[1] if index % stride == 0 else None
+            if frame is not None:
+                stats.add('decode', time.perf_counter() - t)
+                frames.put(frame)
+            index += 1
+    finally:
+        frames.put(None)
+
+
+def render(raw_frame, depth, colormap, pred_only, margin_width, stats):
+    # Colorize stage (thread pool): normalize (unless already uint8), colorize and put the depth next to the frame
+    t = time.perf_counter()
+    if depth.dtype != np.uint8:
+        depth = (depth - depth.min()) / (depth.max() - depth.min()) * 255.0
+        depth = depth.astype(np.uint8)
+
+    depth = colorize_depth(depth, colormap)
+
+    if pred_only:
+        output = depth
+    else:
+        split_region = np.ones((raw_frame.shape[0], margin_width, 3), dtype=np.uint8) * 255
+        output = cv2.hconcat([raw_frame, split_region, depth])
+    stats.add('colorize', time.perf_counter() - t)
+    return output
+
+
+def write_frames(out, results, stats, errors):
+    # Encode stage: rendered frames in order into the VideoWriter. A failed render or write is
+    # appended to `errors` for the main thread to raise, and the queue keeps being drained until
+    # the None sentinel so the main thread never blocks on it.
+    while True:
+        future = results.get()
+        if future is None:
+            break
+        if errors:
+            continue
+        try:
+            frame = future.result()
+            t = time.perf_counter()
+            out.write(frame)
+            stats.add('write', time.perf_counter() - t)
+        except Exception as e:
+            errors.append(e)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Depth Anything V2')
-    
+
     parser.add_argument('--video-path', type=str)
     parser.add_argument('--input-size', type=int, default=518)
     parser.add_argument('--outdir', type=str, default='./vis_video_depth')
-    
+
     parser.add_argument('--encoder', type=str, default='vitl', choices=['vits', 'vitb', 'vitl', 'vitg'])
-    
+    parser.add_argument('--weights', type=str, default=None, help='*.pth, *.onnx or *_openvino_model (default: checkpoints/depth_anything_v2_<encoder>.pth)')
+
+    parser.add_argument('--tiled', action='store_true', help='sliding-window inference on overlapping tiles at full resolution')
+    parser.add_argument('--tile-size', type=int, default=None, help='tile side in pixels (default: half the short side)')
+    parser.add_argument('--tile-overlap', type=float, default=0.25)
+
+    parser.add_argument('--frame-stride', type=int, default=1, help='process every n-th frame (output frame rate is divided accordingly)')
+    parser.add_argument('--batch-size', type=int, default=4, help='frames per forward pass')
+    parser.add_argument('--workers', type=int, default=max(1, min(4, (os.cpu_count() or 1) // 2)), help='colorize/encode threads')
+    parser.add_argument('--streaming', action='store_true', help='temporally consistent mode: keyframe feature reuse, skipped static frames, running-window normalization')
+    parser.add_argument('--skip-thres', type=float, default=0.01, help='streaming: frame change (0-1) below which the previous depth is reused')
+    parser.add_argument('--refresh-thres', type=float, default=0.04, help='streaming: frame change below which deep keyframe features are reused')
+    parser.add_argument('--keyframe-interval', type=int, default=30, help='streaming: max frames between keyframes')
+    parser.add_argument('--queue-size', type=int, default=16, help='frames buffered between stages')
+    parser.add_argument('--decode-workers', type=int, default=0, help='decode chunks of the video in this many processes (seeks over large frame strides), 0 for a single VideoCapture')
+
     parser.add_argument('--pred-only', dest='pred_only', action='store_true', help='only display the prediction')
     parser.add_argument('--grayscale', dest='grayscale', action='store_true', help='do not apply colorful palette')
-    
+    parser.add_argument('--colormap', type=str, default='Spectral_r', choices=COLORMAPS, help='palette for the depth map')
+
     args = parser.parse_args()
-    
+    VideoDecoder = load_video_decoder() if args.decode_workers else None
+    if args.streaming and args.tiled:
+        parser.error('--streaming and --tiled cannot be combined (streaming runs whole-frame keyframe passes)')
+
     DEVICE = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
-    
-    model_configs = {
-        'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
-        'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
-        'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]},
-        'vitg': {'encoder': 'vitg', 'features': 384, 'out_channels': [1536, 1536, 1536, 1536]}
-    }
-    
-    depth_anything = DepthAnythingV2(**model_configs[args.encoder])
-    depth_anything.load_state_dict(torch.load(f'checkpoints/depth_anything_v2_{args.encoder}.pth', map_location='cpu'))
-    depth_anything = depth_anything.to(DEVICE).eval()
-    
+
+    weights = args.weights or f'checkpoints/depth_anything_v2_{args.encoder}.pth'
+    depth_anything = DepthMultiBackend(weights, encoder=args.encoder, device=DEVICE)
+
     if os.path.isfile(args.video_path):
         if args.video_path.endswith('txt'):
             with open(args.video_path, 'r') as f:
-                lines = f.read().splitlines()
+                filenames = f.read().splitlines()
         else:
             filenames = [args.video_path]
     else:
         filenames = glob.glob(os.path.join(args.video_path, '**/*'), recursive=True)
-    
+
     os.makedirs(args.outdir, exist_ok=True)
-    
+
     margin_width = 50
-    cmap = matplotlib.colormaps.get_cmap('Spectral_r')
-    
+    colormap = 'gray' if args.grayscale else args.colormap
+    pool = ThreadPoolExecutor(args.workers, thread_name_prefix='colorize')
+
     for k, filename in enumerate(filenames):
         print(f'Progress {k+1}/{len(filenames)}: {filename}')
-        
-        raw_video = cv2.VideoCapture(filename)
+
+        raw_video = VideoDecoder(filename, args.frame_stride, args.decode_workers) if args.decode_workers else cv2.VideoCapture(filename)
         frame_width, frame_height = int(raw_video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(raw_video.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        frame_rate = int(raw_video.get(cv2.CAP_PROP_FPS))
-        
-        if args.pred_only: 
+        frame_rate = raw_video.get(cv2.CAP_PROP_FPS) / args.frame_stride
+
+        if args.pred_only:
             output_width = frame_width
-        else: 
+        else:
             output_width = frame_width * 2 + margin_width
-        
+
         output_path = os.path.join(args.outdir, os.path.splitext(os.path.basename(filename))[0] + '.mp4')
         out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), frame_rate, (output_width, frame_height))
-        
-        while raw_video.isOpened():
-            ret, raw_frame = raw_video.read()
-            if not ret:
-                break
-            
-            depth = depth_anything.infer_image(raw_frame, args.input_size)
-            
-            depth = (depth - depth.min()) / (depth.max() - depth.min()) * 255.0
-            depth = depth.astype(np.uint8)
-            
-            if args.grayscale:
-                depth = np.repeat(depth[..., np.newaxis], 3, axis=-1)
-            else:
-                depth = (cmap(depth)[:, :, :3] * 255)[:, :, ::-1].astype(np.uint8)
-            
-            if args.pred_only:
-                out.write(depth)
-            else:
-                split_region = np.ones((frame_height, margin_width, 3), dtype=np.uint8) * 255
-                combined_frame = cv2.hconcat([raw_frame, split_region, depth])
-                
-                out.write(combined_frame)
-        
+
+        # decode thread -> frames -> batched inference (this thread) -> colorize pool -> results -> writer thread
+        stats = StageStats()
+        stream = None
+        if args.streaming:
+            stream = VideoDepthStream(depth_anything, args.input_size, args.skip_thres, args.refresh_thres,
+                                      keyframe_interval=args.keyframe_interval)
+        frames, results = queue.Queue(args.queue_size), queue.Queue(args.queue_size)
+        decoder = threading.Thread(target=read_frames, args=(raw_video, frames, args.frame_stride, stats), daemon=True)
+        errors = []  # exception of the writer thread
+        writer = threading.Thread(target=write_frames, args=(out, results, stats, errors), daemon=True)
+        start = time.perf_counter()
+        decoder.start()
+        writer.start()
+
+        try:
+            done = False
+            while not done and not errors:
+                batch = []
+                while len(batch) < args.batch_size:
+                    frame = frames.get()
+                    if frame is None:
+                        done = True
+                        break
+                    batch.append(frame)
+                if not batch:
+                    break
+
+                t = time.perf_counter()
+                if stream is not None:
+                    depths = [stream(frame)[1] for frame in batch]  # sequential, each frame depends on the last keyframe
+                elif args.tiled:
+                    depths = [depth_anything.infer_tiled(frame, args.input_size, args.tile_size, args.tile_overlap) for frame in batch]
+                else:
+                    depths = depth_anything.infer_batch(batch, args.input_size)
+                stats.add('infer', time.perf_counter() - t, len(batch))
+
+                for raw_frame, depth in zip(batch, depths):
+                    results.put(pool.submit(render, raw_frame, depth, colormap, args.pred_only, margin_width, stats))
+        finally:
+            results.put(None)
+            writer.join()
+        if errors:
+            raise errors[0]
+
+        decoder.join()
         raw_video.release()
         out.release()
+        print(stats.report(time.perf_counter() - start, args.workers))
+        if stream is not None:
+            print('Streaming: ' + ', '.join(f'{stream.counts[mode]} {mode}' for mode in ('keyframe', 'refresh', 'skip')))
+
+    pool.shutdown()
@@ -0,0 +1,19 @@
+"""
+Makes the helpers shared with the YOLOv5 app importable
+
+Micro-batching, upload decoding, response encoding, the result cache, the
+gunicorn worker setup (its serving/ package) and the parallel video decoder
+(its utils/video_decode.py) live once, in the YOLOv5 app. Importing this module
+appends that app's directory to sys.path, after this app's own modules.
+
+    YOLO_APP_DIR    the YOLOv5 app directory (default ../yolo-v5-flask-app)
+"""
+
+import os
+import sys
+
+YOLO_APP_DIR = os.path.abspath(
+    os.getenv('YOLO_APP_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yolo-v5-flask-app')))
+
+if YOLO_APP_DIR not in sys.path:
+    sys.path.append(YOLO_APP_DIR)
@@ -1,21 +1,24 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
-import io
 import numpy as np
-from PIL import Image
 import torch
 import cv2
 from pathlib import Path
 import tempfile
 import base64
+import threading
 
+from serving.batching import MicroBatcher
+from serving.image_decode import decode_image as decode_image_bytes
+from serving.responses import IMAGE_CODECS, encode_image, image_parts_from_form
+from serving.result_cache import ResultCache
 
 try:
     from models.common import DetectMultiBackend
     from utils.general import non_max_suppression, scale_boxes, xyxy2xywh
+    from utils.slicing import sliced_inference
     from utils.torch_utils import select_device
-    from utils.augmentations import letterbox
     from ultralytics.utils.plotting import Annotator, colors
 except ImportError as e:
     print(f"Warning: YOLOv5 imports failed: {e}")
@@ -38,20 +41,37 @@ YOLO_CONFIG = {
     'conf_thres': 0.25,  # Confidence threshold
     'iou_thres': 0.45,  # IoU threshold for NMS
     'max_det': 1000,  # Maximum detections per image
+    'head_topk': 1000,  # Candidates per scale decoded by the Detect head before NMS (0 decodes every anchor)
     'classes': None,  # Filter by class (None for all classes)
     'agnostic_nms': False,  # Class-agnostic NMS
     'augment': False,  # Augmented inference
     'half': False,  # Use FP16 half-precision inference
+    'compile': None,  # None (eager), 'compile' (torch.compile) or 'freeze' (frozen TorchScript per batch size)
+    'compile_cache_dir': 'compile_cache',  # Compiled artifacts reused across restarts
+    'slice_tiles': None,  # (rows, cols) grid of overlapping tiles for small objects, e.g. (2, 2); None disables
+    'slice_overlap': 0.2,  # Fraction of a tile shared with its neighbours
+    'slice_full_frame': True,  # Also run the whole frame in the tile batch (large objects)
+    'slice_merge_thres': 0.5,  # Intersection over the smaller box above which cross-tile detections are merged
+    'reduced_decode': True,  # Decode large JPEGs at reduced resolution (boxes are still reported in original pixels)
+    'max_batch_size': 8,  # Max concurrent requests merged into one forward pass (1 disables batching)
+    'max_batch_wait_ms': 10,  # Max time the first request in a batch waits for others
+    'image_codec': 'jpeg',  # Codec for returned images: 'jpeg', 'png' or 'webp'
+    'image_quality': 90,  # Returned image quality (png: compression level 0-9)
+    'cache_max_mb': 64,  # Memory budget of the result cache for repeated uploads (0 disables caching)
+    'cache_ttl_s': 600,  # Seconds a cached result stays valid
+    'cache_dir': None,  # Optional directory shared by all workers, e.g. '/dev/shm/yolo-cache'
 }
 
 # Global model variable (loaded once on startup)
 model = None
 device = None
 names = None
+batcher = None
+result_cache = None
 
 def load_yolo_model():
     """Load YOLOv5 model once on startup"""
-    global model, device, names
+    global model, device, names, batcher, result_cache
     
     try:
         device = select_device(YOLO_CONFIG['device'])
@@ -63,9 +83,39 @@ def load_yolo_model():
         )
         names = model.names
         
-        # Warmup
+        # Threshold and top-k candidates inside the Detect head instead of decoding every anchor
+        # (PyTorch weights only; augmented inference needs the full anchor layout)
+        if YOLO_CONFIG['head_topk'] and model.pt and not YOLO_CONFIG['augment']:
+            head = model.model.model[-1]  # Detect()
+            head.prefilter = True
+            head.prefilter_conf = YOLO_CONFIG['conf_thres']
+            head.prefilter_topk = YOLO_CONFIG['head_topk']
+        
+        # Warmup, compiling for every batch size the micro-batcher can form when requested
         imgsz = YOLO_CONFIG['imgsz']
-        model.warmup(imgsz=(1, 3, imgsz, imgsz))
+        if YOLO_CONFIG['compile'] and not YOLO_CONFIG['augment']:
+            shapes = [(bs, 3, imgsz, imgsz) for bs in range(1, max(1, YOLO_CONFIG['max_batch_size']) + 1)]
+            model.optimize(YOLO_CONFIG['compile'], shapes, YOLO_CONFIG['compile_cache_dir'])
+        else:
+            model.warmup(imgsz=(1, 3, imgsz, imgsz))
+        
+        # Micro-batching of concurrent requests
+        if YOLO_CONFIG['max_batch_size'] > 1:
+            batcher = MicroBatcher(
+                run_batched_inference,
+                max_batch_size=YOLO_CONFIG['max_batch_size'],
+                max_wait_ms=YOLO_CONFIG['max_batch_wait_ms'],
+                bucket_key=lambda img_tensor: tuple(img_tensor.shape),
+                name='yolo-batcher'
+            )
+        
+        # Cache of results for byte-identical uploads
+        if YOLO_CONFIG['cache_max_mb'] > 0:
+            result_cache = ResultCache(
+                max_bytes=YOLO_CONFIG['cache_max_mb'] * 1024 * 1024,
+                ttl_s=YOLO_CONFIG['cache_ttl_s'],
+                disk_dir=YOLO_CONFIG['cache_dir']
+            )
         
         print(f"YOLOv5 model loaded successfully on {device}")
         print(f"Model classes: {names}")
@@ -80,34 +130,83 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def preprocess_image(image_file):
-    """Preprocess image for YOLOv5 inference"""
+def preprocess_image(image_bytes):
+    """Preprocess image for YOLOv5 inference
+    
+    With slice_tiles the image is decoded at full resolution and no input
+    tensor is made (None); tiles are cut from img_bgr at inference.
+    """
     try:
-        # Read image from file object
-        image = Image.open(image_file).convert('RGB')
-        img_array = np.array(image)
-        
-        # Convert RGB to BGR for OpenCV
-        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        
-        # Letterbox resize
-        img_resized = letterbox(img_bgr, YOLO_CONFIG['imgsz'], stride=32, auto=True)[0]
-        
-        # Convert BGR to RGB, transpose and normalize
-        img_rgb = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
-        img_tensor = img_rgb.transpose((2, 0, 1))  # HWC to CHW
-        img_tensor = np.ascontiguousarray(img_tensor)
-        img_tensor = torch.from_numpy(img_tensor).to(device)
-        img_tensor = img_tensor.float() / 255.0  # Normalize to 0-1
+        if YOLO_CONFIG['slice_tiles']:
+            img_bgr, original_shape = decode_image_bytes(image_bytes)
+            return None, img_bgr, original_shape
         
-        if len(img_tensor.shape) == 3:
-            img_tensor = img_tensor[None]  # Add batch dimension
+        img_bgr, original_shape = decode_image(image_bytes)
+        img_tensor = image_to_tensor(img_bgr)
             
-        return img_tensor, img_bgr, img_array
+        return img_tensor, img_bgr, original_shape
         
     except Exception as e:
         raise Exception(f"Error preprocessing image: {e}")
 
+def decode_image(image_bytes, min_short_side=0):
+    """Decode uploaded image bytes into a BGR array (for OpenCV) and the original (height, width)
+    
+    With reduced_decode, JPEGs much larger than the model input are decoded at
+    1/2, 1/4 or 1/8 scale, never below imgsz on the long side (nor below
+    min_short_side on the short side).
+    """
+    if not YOLO_CONFIG['reduced_decode']:
+        return decode_image_bytes(image_bytes)
+    imgsz = YOLO_CONFIG['imgsz']
+    return decode_image_bytes(image_bytes, min_long_side=imgsz if isinstance(imgsz, int) else max(imgsz),
+                              min_short_side=min_short_side)
+
+# Per-thread model input buffers, reused while the input shape stays the same
+_input_buffers = threading.local()
+
+def image_to_tensor(img_bgr):
+    """Letterbox and normalize a decoded BGR image straight into a reusable model input tensor
+    
+    The returned tensor is overwritten by the next call on the same thread, so
+    use it before preprocessing another image.
+    """
+    # Letterbox geometry, as in utils.augmentations.letterbox (fixed square shape
+    # when batching so requests share a batch, and with frozen models, which only
+    # exist for the square shapes)
+    auto = YOLO_CONFIG['max_batch_size'] <= 1 and YOLO_CONFIG['compile'] != 'freeze'
+    imgsz = YOLO_CONFIG['imgsz']
+    new_shape = (imgsz, imgsz) if isinstance(imgsz, int) else tuple(imgsz)
+    h0, w0 = img_bgr.shape[:2]
+    r = min(new_shape[0] / h0, new_shape[1] / w0)
+    new_w, new_h = int(round(w0 * r)), int(round(h0 * r))
+    dw, dh = new_shape[1] - new_w, new_shape[0] - new_h
+    if auto:
+        dw, dh = dw % 32, dh % 32
+    top, left = int(round(dh / 2 - 0.1)), int(round(dw / 2 - 0.1))
+    height, width = new_h + dh, new_w + dw
+    
+    # Single resize, skipped when the image already has the target size
+    if (w0, h0) != (new_w, new_h):
+        img_bgr = cv2.resize(img_bgr, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    
+    buffer = getattr(_input_buffers, 'tensor', None)
+    if buffer is None or buffer.shape[2:] != (height, width):
+        buffer = torch.empty((1, 3, height, width), dtype=torch.float32)
+        _input_buffers.tensor = buffer
+    chw = buffer.numpy()[0]
+    
+    # Gray letterbox border, then BGR to RGB, HWC to CHW and 0-1 scaling in one pass per channel
+    pad = np.float32(114) / np.float32(255)
+    chw[:, :top] = pad
+    chw[:, top + new_h:] = pad
+    chw[:, top:top + new_h, :left] = pad
+    chw[:, top:top + new_h, left + new_w:] = pad
+    for c in range(3):
+        np.divide(img_bgr[:, :, 2 - c], np.float32(255), out=chw[c, top:top + new_h, left:left + new_w], dtype=np.float32)
+    
+    return buffer.to(device)
+
 def run_inference(img_tensor):
     """Run YOLOv5 inference on preprocessed image"""
     try:
@@ -121,7 +220,8 @@ def run_inference(img_tensor):
             YOLO_CONFIG['iou_thres'],
             YOLO_CONFIG['classes'],
             YOLO_CONFIG['agnostic_nms'],
-            max_det=YOLO_CONFIG['max_det']
+            max_det=YOLO_CONFIG['max_det'],
+            batched=True  # one pass over all images of a micro-batch
         )
         
         return pred
@@ -129,8 +229,69 @@ def run_inference(img_tensor):
     except Exception as e:
         raise Exception(f"Error during inference: {e}")
 
-def process_detections(pred, img_bgr, img_tensor):
-    """Process detection results and return formatted data"""
+def run_sliced_inference(img_bgr):
+    """Run YOLOv5 on overlapping tiles of img_bgr (plus the full frame) in one batch, detections in img_bgr pixels"""
+    try:
+        with torch.no_grad():
+            det = sliced_inference(
+                model,
+                img_bgr,
+                YOLO_CONFIG['imgsz'],
+                tiles=YOLO_CONFIG['slice_tiles'],
+                overlap=YOLO_CONFIG['slice_overlap'],
+                full_frame=YOLO_CONFIG['slice_full_frame'],
+                conf_thres=YOLO_CONFIG['conf_thres'],
+                iou_thres=YOLO_CONFIG['iou_thres'],
+                classes=YOLO_CONFIG['classes'],
+                agnostic=YOLO_CONFIG['agnostic_nms'],
+                max_det=YOLO_CONFIG['max_det'],
+                merge_thres=YOLO_CONFIG['slice_merge_thres'],
+                augment=YOLO_CONFIG['augment']
+            )
+        
+        return [det]
+        
+    except Exception as e:
+        raise Exception(f"Error during sliced inference: {e}")
+
+def infer(img_tensor, img_bgr=None):
+    """Run inference, merged with concurrent requests when batching is enabled
+    
+    Without an input tensor (slice_tiles) img_bgr is detected tile by tile instead.
+    """
+    if img_tensor is None:
+        return run_sliced_inference(img_bgr)
+    if batcher is not None:
+        return batcher.submit(img_tensor)
+    return run_inference(img_tensor)
+
+def cached_infer(image_bytes, img_tensor, img_bgr=None):
+    """infer() behind the result cache, keyed by the uploaded bytes and YOLO_CONFIG"""
+    if result_cache is None:
+        return infer(img_tensor, img_bgr)
+    
+    key = result_cache.make_key(image_bytes, YOLO_CONFIG)
+    cached = result_cache.get(key)
+    if cached is not None:
+        # process_detections rescales boxes in place, so hand out copies
+        return [det.clone().to(device) for det in cached]
+    
+    pred = infer(img_tensor, img_bgr)
+    result_cache.put(key, [det.detach().cpu().clone() for det in pred])
+    return pred
+
+def run_batched_inference(img_tensors):
+    """Run one forward pass over same-shape image tensors and split predictions per image"""
+    pred = run_inference(torch.cat(img_tensors, 0))
+    return [[det] for det in pred]
+
+def process_detections(pred, img_bgr, img_tensor, original_shape=None):
+    """Process detection results and return formatted data
+    
+    Boxes are drawn on img_bgr and reported in original_shape pixels, for images
+    decoded at reduced resolution. Without img_tensor (sliced inference) boxes
+    are already in img_bgr pixels.
+    """
     detections = []
     annotated_image = None
     
@@ -139,7 +300,12 @@ def process_detections(pred, img_bgr, img_tensor):
         
         if len(det):
             # Scale boxes from img_size to original image size
-            det[:, :4] = scale_boxes(img_tensor.shape[2:], det[:, :4], img_bgr.shape).round()
+            if img_tensor is not None:
+                det[:, :4] = scale_boxes(img_tensor.shape[2:], det[:, :4], img_bgr.shape)
+            
+            # Gain from decoded to original image pixels
+            h0, w0 = original_shape or img_bgr.shape[:2]
+            gain = (w0 / img_bgr.shape[1], h0 / img_bgr.shape[0]) * 2
             
             # Create annotator for drawing boxes
             annotator = Annotator(img_bgr, line_width=3, example=str(names))
@@ -151,7 +317,7 @@ def process_detections(pred, img_bgr, img_tensor):
                 confidence = float(conf)
                 
                 # Convert coordinates to list
-                bbox = [int(x) for x in xyxy]
+                bbox = [int(round(float(x) * g)) for x, g in zip(xyxy, gain)]
                 
                 # Add detection to results
                 detections.append({
@@ -166,7 +332,7 @@ def process_detections(pred, img_bgr, img_tensor):
                 
                 # Draw bounding box on image
                 label = f'{class_name} {confidence:.2f}'
-                annotator.box_label(xyxy, label, color=colors(class_id, True))
+                annotator.box_label([round(float(x)) for x in xyxy], label, color=colors(class_id, True))
             
             # Get annotated image
             annotated_image = annotator.result()
@@ -178,25 +344,62 @@ def process_detections(pred, img_bgr, img_tensor):
     except Exception as e:
         raise Exception(f"Error processing detections: {e}")
 
+def detect_frame(img_bgr):
+    """Detect objects in one decoded BGR frame (streaming), no drawing
+    
+    Returns compact [x1, y1, x2, y2, confidence, class_id] rows in frame pixels.
+    """
+    img_tensor = None if YOLO_CONFIG['slice_tiles'] else image_to_tensor(img_bgr)
+    det = infer(img_tensor, img_bgr)[0]
+    if img_tensor is not None and len(det):
+        det[:, :4] = scale_boxes(img_tensor.shape[2:], det[:, :4], img_bgr.shape)
+    return [[*(round(v) for v in row[:4]), round(row[4], 3), int(row[5])] for row in det.tolist()]
+
 def encode_image_to_base64(img_array):
     """Convert image array to base64 string"""
     try:
-        # Convert BGR to RGB
-        img_rgb = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
-        img_pil = Image.fromarray(img_rgb)
-        
-        # Save to bytes buffer
-        buffer = io.BytesIO()
-        img_pil.save(buffer, format='JPEG', quality=90)
-        img_bytes = buffer.getvalue()
+        # Encode straight from the BGR buffer
+        codec = YOLO_CONFIG['image_codec']
+        img_bytes = encode_image(img_array, codec, YOLO_CONFIG['image_quality'])
         
         # Encode to base64
         img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-        return f"data:image/jpeg;base64,{img_base64}"
+        return f"data:{IMAGE_CODECS[codec][1]};base64,{img_base64}"
         
     except Exception as e:
         raise Exception(f"Error encoding image: {e}")
 
+def detect_image(image_file, filename, include_image=False, encode=encode_image_to_base64):
+    """Run the full detection pipeline on one uploaded image and build the response"""
+    # Preprocess image
+    image_bytes = image_file.read()
+    img_tensor, img_bgr, original_shape = preprocess_image(image_bytes)
+    
+    # Run inference (or reuse the result for an identical upload)
+    predictions = cached_infer(image_bytes, img_tensor, img_bgr)
+    
+    # Process detections
+    detections, annotated_image = process_detections(predictions, img_bgr, img_tensor, original_shape)
+    print(f"Detections: {len(detections)} found")
+    # print(detections)
+    # Prepare response
+    response_data = {
+        'success': True,
+        'detections': detections,
+        'detection_count': len(detections),
+        'image_info': {
+            'filename': filename,
+            'original_size': original_shape,  # (height, width)
+            'processed_size': img_bgr.shape[:2]
+        }
+    }
+    
+    # Include annotated image if requested
+    if include_image:
+        response_data['annotated_image'] = encode(annotated_image)
+    
+    return response_data
+
 @app.route('/yolo/detect', methods=['POST'])
 def detect_objects():
     """Main endpoint for object detection"""
@@ -224,32 +427,20 @@ def detect_objects():
         # Reset file pointer to beginning
         file.seek(0)
         
-        # Preprocess image
-        img_tensor, img_bgr, original_img = preprocess_image(file)
-        
-        # Run inference
-        predictions = run_inference(img_tensor)
-        
-        # Process detections
-        detections, annotated_image = process_detections(predictions, img_bgr, img_tensor)
-        print(f"Detections: {len(detections)} found")
-        # print(detections)
-        # Prepare response
-        response_data = {
-            'success': True,
-            'detections': detections,
-            'detection_count': len(detections),
-            'image_info': {
-                'filename': file.filename,
-                'original_size': original_img.shape[:2],  # (height, width)
-                'processed_size': img_bgr.shape[:2]
-            }
-        }
+        # Binary (multipart) or JSON response
+        try:
+            image_parts = image_parts_from_form(request.form, YOLO_CONFIG['image_codec'], YOLO_CONFIG['image_quality'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Include annotated image if requested
+        # Run detection pipeline
         include_image = request.form.get('include_image', 'false').lower() == 'true'
-        if include_image:
-            response_data['annotated_image'] = encode_image_to_base64(annotated_image)
+        if image_parts is not None:
+            response_data = detect_image(file, file.filename, include_image, encode=image_parts)
+            body, content_type = image_parts.multipart(response_data)
+            return Response(body, content_type=content_type), 200
+        
+        response_data = detect_image(file, file.filename, include_image)
         
         return jsonify(response_data), 200
         
@@ -257,30 +448,40 @@ def detect_objects():
         print(f"Error in object detection: {str(e)}")
         return jsonify({'error': f'Detection failed: {str(e)}'}), 500
 
+def model_info_payload():
+    """Information about the loaded model"""
+    return {
+        'model_loaded': True,
+        'device': str(device),
+        'classes': names,
+        'num_classes': len(names) if names else 0,
+        'config': YOLO_CONFIG,
+        'batching': batcher.stats() if batcher is not None else None,
+        'cache': result_cache.stats() if result_cache is not None else None
+    }
+
+def health_payload(message):
+    """Health check information"""
+    return {
+        'status': 'healthy',
+        'message': message,
+        'model_loaded': model is not None,
+        'allowed_extensions': list(ALLOWED_EXTENSIONS),
+        'max_file_size_mb': MAX_FILE_SIZE // (1024 * 1024)
+    }
+
 @app.route('/model-info', methods=['GET'])
 def model_info():
     """Get information about the loaded model"""
     if model is None:
         return jsonify({'error': 'Model not loaded'}), 500
     
-    return jsonify({
-        'model_loaded': True,
-        'device': str(device),
-        'classes': names,
-        'num_classes': len(names) if names else 0,
-        'config': YOLO_CONFIG
-    }), 200
+    return jsonify(model_info_payload()), 200
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'message': 'Flask YOLOv5 API is running',
-        'model_loaded': model is not None,
-        'allowed_extensions': list(ALLOWED_EXTENSIONS),
-        'max_file_size_mb': MAX_FILE_SIZE // (1024 * 1024)
-    }), 200
+    return jsonify(health_payload('Flask YOLOv5 API is running')), 200
 
 @app.errorhandler(413)
 def too_large(e):
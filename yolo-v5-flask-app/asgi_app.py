@@ -0,0 +1,374 @@
+"""
+Async (ASGI) variant of the YOLOv5 API
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+
+Multipart uploads are streamed and parsed on the event loop, so slow clients
+only hold a cheap coroutine. Decode and inference run on a bounded thread pool,
+and requests beyond its queue limit are refused with 503 and Retry-After.
+
+WebSocket /yolo/stream detects a live feed (a stream URL read on the server,
+or encoded frames pushed by the client) at a target FPS, always on the newest
+frame, and streams back one compact JSON record per processed frame.
+"""
+
+import asyncio
+import contextlib
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+import app as yolo_app
+from app import ALLOWED_EXTENSIONS, MAX_FILE_SIZE, YOLO_CONFIG, allowed_file
+from serving.responses import image_parts_from_form
+from utils.dataloaders import LoadStreams
+
+ASYNC_CONFIG = {
+    'executor_workers': 8,  # Threads running decode + inference (>= max_batch_size so batches can fill)
+    'max_pending': 32,  # Requests running or waiting for a thread before 503
+    'retry_after_s': 1,  # Retry-After header value on 503
+}
+
+STREAM_CONFIG = {
+    'fps': 10,  # Default detection rate of a stream
+    'max_fps': 30,  # Highest rate a client may ask for
+    'max_streams': 4,  # Concurrent /yolo/stream connections
+    'allowed_schemes': ('rtsp', 'rtsps', 'http', 'https'),  # URL schemes a client may ask the server to read
+    'allowed_sources': (),  # URL prefixes a client may ask for, e.g. ['rtsp://cameras.local/'] (empty: pushed frames only)
+}
+
+
+class QueueFullError(Exception):
+    """Raised when the executor has no room for more work"""
+
+
+class BoundedExecutor:
+    """Thread pool that refuses work once `max_pending` jobs are running or queued"""
+
+    def __init__(self, max_workers, max_pending):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='inference')
+        self.max_pending = max_pending
+        self.pending = 0  # only touched from the event loop thread
+
+    async def run(self, fn, *args, **kwargs):
+        if self.pending >= self.max_pending:
+            raise QueueFullError()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+executor = BoundedExecutor(ASYNC_CONFIG['executor_workers'], ASYNC_CONFIG['max_pending'])
+
+
+class BodyTooLargeError(Exception):
+    """Raised when a request body grows past MAX_FILE_SIZE"""
+
+
+def declared_length(request):
+    """Content-Length of the request, None if absent; raises ValueError when malformed"""
+    value = request.headers.get('content-length')
+    if value is None:
+        return None
+    length = int(value)
+    if length < 0:
+        raise ValueError(value)
+    return length
+
+
+def size_limited(request, max_size):
+    """Request whose body raises BodyTooLargeError once more than max_size bytes arrive (chunked uploads included)"""
+    receive, received = request.receive, 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > max_size:
+                raise BodyTooLargeError()
+        return message
+
+    return Request(request.scope, limited_receive)
+
+
+def check_text_fields(form):
+    """Raise ValueError if a field other than the image upload was sent as a file part"""
+    for key, value in form.multi_items():
+        if key != 'image' and not isinstance(value, str):
+            raise ValueError(f'{key} must be a text field')
+
+
+def too_large_response():
+    return JSONResponse({'error': f'File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB'}, status_code=413)
+
+
+def busy_response():
+    return JSONResponse(
+        {'error': 'Server busy, please retry'},
+        status_code=503,
+        headers={'Retry-After': str(ASYNC_CONFIG['retry_after_s'])}
+    )
+
+
+async def detect_objects(request):
+    """Async endpoint for object detection"""
+    if yolo_app.model is None:
+        return JSONResponse({'error': 'YOLOv5 model not loaded'}, status_code=500)
+
+    # Refuse early, before reading the body
+    if executor.pending >= executor.max_pending:
+        return busy_response()
+    try:
+        length = declared_length(request)
+    except ValueError:
+        return JSONResponse({'error': 'Invalid Content-Length header'}, status_code=400)
+    if length is not None and length > MAX_FILE_SIZE:
+        return too_large_response()
+
+    try:
+        form = await size_limited(request, MAX_FILE_SIZE).form()
+    except BodyTooLargeError:
+        return too_large_response()
+    except Exception as e:
+        return JSONResponse({'error': f'Invalid multipart upload: {e}'}, status_code=400)
+
+    try:
+        file = form.get('image')
+        if file is None or not hasattr(file, 'filename'):
+            return JSONResponse({'error': 'No image file provided'}, status_code=400)
+        if file.filename == '':
+            return JSONResponse({'error': 'No file selected'}, status_code=400)
+        if not allowed_file(file.filename):
+            return JSONResponse({
+                'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+            }, status_code=400)
+
+        try:
+            check_text_fields(form)
+            image_parts = image_parts_from_form(form, YOLO_CONFIG['image_codec'], YOLO_CONFIG['image_quality'])
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+
+        include_image = form.get('include_image', 'false').lower() == 'true'
+        encode = image_parts or yolo_app.encode_image_to_base64
+        await file.seek(0)
+        response_data = await executor.run(yolo_app.detect_image, file.file, file.filename, include_image, encode=encode)
+        if image_parts is not None:
+            body, content_type = image_parts.multipart(response_data)
+            return Response(body, media_type=content_type)
+        return JSONResponse(response_data)
+
+    except QueueFullError:
+        return busy_response()
+    except Exception as e:
+        print(f"Error in object detection: {str(e)}")
+        return JSONResponse({'error': f'Detection failed: {str(e)}'}, status_code=500)
+    finally:
+        await form.close()
+
+
+class LatestFrame:
+    """Single-slot frame buffer: a new frame replaces one not yet taken (latest frame wins)"""
+
+    def __init__(self):
+        self.frame = None
+        self.seq = 0  # frames received
+        self.ts = 0.0  # arrival time of the current frame
+        self.dropped = 0  # frames replaced before being processed
+        self.event = asyncio.Event()
+
+    def put(self, frame, seq=None, ts=None):
+        if self.frame is not None:
+            self.dropped += 1
+        self.frame, self.ts = frame, time.time() if ts is None else ts
+        self.seq = self.seq + 1 if seq is None else seq
+        self.event.set()
+
+    async def get(self):
+        await self.event.wait()
+        self.event.clear()
+        frame, self.frame = self.frame, None
+        return self.seq, self.ts, frame
+
+
+async def receive_frames(websocket, latest):
+    """Push mode: every binary message is an encoded frame"""
+    while True:
+        message = await websocket.receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+        if message.get('bytes'):
+            latest.put(message['bytes'])
+
+
+def allowed_stream_source(source):
+    """Whether the server may open a client-supplied stream source
+
+    Only URLs with an allowed scheme and a host, under one of the
+    STREAM_CONFIG['allowed_sources'] prefixes. With no prefixes configured, URL
+    mode is off and clients can only push frames. Local paths (which LoadStreams
+    would read as stream lists), webcam indices and other schemes are refused.
+    """
+    if not isinstance(source, str) or any(c.isspace() for c in source):
+        return False
+    url = urlparse(source)
+    if url.scheme.lower() not in STREAM_CONFIG['allowed_schemes'] or not url.hostname:
+        return False
+    prefixes = STREAM_CONFIG['allowed_sources'] or ()
+    return any(prefix and source.startswith(prefix) for prefix in prefixes)
+
+
+async def pull_frames(dataset, latest, fps):
+    """URL mode: hand the newest frame of the LoadStreams ring to `latest` whenever the previous one was taken, until
+    the stream ends. Frames the ring drops in between count in `latest.dropped`."""
+    ring, counted = dataset.rings[0], 0
+    while dataset.threads[0].is_alive() or ring.ready:
+        if latest.frame is None:
+            frame = ring.get()
+            if frame is not None:
+                latest.put(frame[0].copy(), *frame[1:])  # the ring reuses the slot after the next get()
+                latest.dropped += ring.dropped - counted
+                counted = ring.dropped
+        await asyncio.sleep(min(0.25 / fps, 0.01))
+
+
+def detect_stream_frame(frame):
+    """Decode (pushed frames are encoded bytes) and detect one stream frame, returns ((height, width), detections)"""
+    img_bgr = yolo_app.decode_image_bytes(frame)[0] if isinstance(frame, bytes) else frame
+    return img_bgr.shape[:2], yolo_app.detect_frame(img_bgr)
+
+
+active_streams = 0
+
+
+async def stream_detections(websocket):
+    """WebSocket detection stream
+
+    The client opens with a JSON message, {"source": "rtsp://...", "fps": 10}
+    for the server to read the stream (see allowed_stream_source), or
+    {"fps": 10} to push encoded frames (JPEG, PNG, ...) as binary messages.
+    The server replies {"names": [...], "fps": ...} once, then sends
+    {"seq", "ts", "size": [h, w], "dropped",
+    "det": [[x1, y1, x2, y2, conf, class_id], ...]} per processed frame. Frames
+    arriving faster than the target FPS or than inference replace each other,
+    so only the newest is detected.
+    """
+    global active_streams
+    await websocket.accept()
+    if yolo_app.model is None:
+        await websocket.close(code=1011, reason='YOLOv5 model not loaded')
+        return
+    if active_streams >= STREAM_CONFIG['max_streams']:
+        await websocket.close(code=1013, reason='Too many streams, please retry')
+        return
+
+    active_streams += 1
+    loop = asyncio.get_running_loop()
+    latest, dataset, feeder = LatestFrame(), None, None
+    try:
+        config = await websocket.receive_json()
+        fps = min(float(config.get('fps') or STREAM_CONFIG['fps']), STREAM_CONFIG['max_fps'])
+        if config.get('source'):
+            source = config['source']
+            if not allowed_stream_source(source):
+                await websocket.close(code=1008, reason='Stream source not allowed')
+                return
+            imgsz, stride = YOLO_CONFIG['imgsz'], int(yolo_app.model.stride)
+            try:
+                open_stream = functools.partial(LoadStreams, source, imgsz, stride, auto=False)
+                dataset = await loop.run_in_executor(None, open_stream)
+            except Exception as e:
+                print(f"Error opening stream {source}: {str(e)}")
+                await websocket.close(code=1011, reason='Cannot open stream')
+                return
+            feeder = asyncio.create_task(pull_frames(dataset, latest, fps))
+        else:
+            feeder = asyncio.create_task(receive_frames(websocket, latest))
+        await websocket.send_json({'names': yolo_app.names, 'fps': fps})
+
+        while True:
+            deadline = loop.time() + 1 / fps
+            get = asyncio.create_task(latest.get())
+            done, _ = await asyncio.wait({get, feeder}, return_when=asyncio.FIRST_COMPLETED)
+            if get not in done:  # client gone or stream over
+                get.cancel()
+                break
+            seq, ts, frame = get.result()
+            try:
+                size, det = await executor.run(detect_stream_frame, frame)
+            except QueueFullError:
+                latest.dropped += 1
+                continue
+            record = {'seq': seq, 'ts': round(ts, 3), 'size': size, 'dropped': latest.dropped, 'det': det}
+            await websocket.send_json(record)
+            await asyncio.sleep(max(0.0, deadline - loop.time()))  # target FPS
+
+        if dataset is not None:
+            await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Error in detection stream: {str(e)}")
+        with contextlib.suppress(Exception):
+            await websocket.close(code=1011, reason='Detection stream failed')
+    finally:
+        active_streams -= 1
+        if feeder is not None:
+            feeder.cancel()
+        if dataset is not None:
+            await loop.run_in_executor(None, dataset.close)
+
+
+async def model_info(request):
+    """Get information about the loaded model"""
+    if yolo_app.model is None:
+        return JSONResponse({'error': 'Model not loaded'}, status_code=500)
+    return JSONResponse({**yolo_app.model_info_payload(), 'async': {**ASYNC_CONFIG, 'pending': executor.pending}})
+
+
+async def health_check(request):
+    """Health check endpoint"""
+    return JSONResponse(yolo_app.health_payload('Async YOLOv5 API is running'))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    print("Loading YOLOv5 model...")
+    if yolo_app.model is None and not await asyncio.get_running_loop().run_in_executor(None, yolo_app.load_yolo_model):
+        print("✗ Failed to load model - API will not work properly")
+    yield
+    executor.shutdown()
+
+
+app = Starlette(
+    routes=[
+        Route('/yolo/detect', detect_objects, methods=['POST']),
+        WebSocketRoute('/yolo/stream', stream_detections),
+        Route('/model-info', model_info, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=5000)
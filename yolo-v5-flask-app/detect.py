@@ -63,6 +63,7 @@ from utils.general import (
     strip_optimizer,
     xyxy2xywh,
 )
+from utils.slicing import sliced_inference
 from utils.torch_utils import select_device, smart_inference_mode
 
 
@@ -97,6 +98,11 @@ def run(
     half=False,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
     vid_stride=1,  # video frame-rate stride
+    reduced_decode=False,  # decode large JPEGs at reduced resolution
+    slice_tiles=None,  # sliced inference on a (rows, cols) grid of overlapping tiles, i.e. (2, 2)
+    slice_overlap=0.2,  # sliced inference: fraction of a tile shared with its neighbours
+    slice_full_frame=True,  # sliced inference: include the full frame in the tile batch
+    decode_workers=0,  # parallel video decode processes, 0 for a single cv2.VideoCapture
 ):
     """
     Runs YOLOv5 detection inference on various sources like images, videos, directories, streams, etc.
@@ -133,6 +139,16 @@ def run(
         half (bool): If True, use FP16 half-precision inference. Default is False.
         dnn (bool): If True, use OpenCV DNN backend for ONNX inference. Default is False.
         vid_stride (int): Stride for processing video frames, to skip frames between processing. Default is 1.
+        reduced_decode (bool): If True, decode large JPEGs at 1/2, 1/4 or 1/8 scale (never below imgsz). Saved images and
+            crops are then smaller than the source; normalized labels are unaffected. Default is False.
+        slice_tiles (tuple[int, int] | None): Detect small objects on a (rows, cols) grid of overlapping tiles of the
+            original image, run as one batch (plus the full frame with `slice_full_frame`) and merged with a cross-tile
+            NMS. Default is None (single letterboxed pass).
+        slice_overlap (float): Fraction of a tile shared with its neighbours in sliced inference. Default is 0.2.
+        slice_full_frame (bool): If True, sliced inference also runs the full frame. Default is True.
+        decode_workers (int): Decode video files in chunks across this many processes, seeking over large
+            `vid_stride` gaps instead of decoding them. Frames are reassembled in order. Default is 0 (single
+            cv2.VideoCapture).
 
     Returns:
         None
@@ -171,12 +187,22 @@ def run(
     bs = 1  # batch_size
     if webcam:
         view_img = check_imshow(warn=True)
-        dataset = LoadStreams(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        dataset = LoadStreams(
+            source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride, decode_workers=decode_workers
+        )
         bs = len(dataset)
     elif screenshot:
         dataset = LoadScreenshots(source, img_size=imgsz, stride=stride, auto=pt)
     else:
-        dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        dataset = LoadImages(
+            source,
+            img_size=imgsz,
+            stride=stride,
+            auto=pt,
+            vid_stride=vid_stride,
+            reduced_decode=reduced_decode,
+            decode_workers=decode_workers,
+        )
     vid_path, vid_writer = [None] * bs, [None] * bs
 
     # Run inference
@@ -195,7 +221,26 @@ def run(
         # Inference
         with dt[1]:
             visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
-            if model.xml and im.shape[0] > 1:
+            if slice_tiles:
+                # Tiles of each original image as one batch, NMS included, boxes in im0 pixels
+                pred = [
+                    sliced_inference(
+                        model,
+                        im0,
+                        imgsz,
+                        slice_tiles,
+                        slice_overlap,
+                        slice_full_frame,
+                        conf_thres,
+                        iou_thres,
+                        classes,
+                        agnostic_nms,
+                        max_det,
+                        augment=augment,
+                    )
+                    for im0 in (im0s if webcam else [im0s])
+                ]
+            elif model.xml and im.shape[0] > 1:
                 pred = None
                 for image in ims:
                     if pred is None:
@@ -207,7 +252,8 @@ def run(
                 pred = model(im, augment=augment, visualize=visualize)
         # NMS
         with dt[2]:
-            pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
+            if not slice_tiles:
+                pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
 
         # Second-stage classifier (optional)
         # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
@@ -243,8 +289,11 @@ def run(
             imc = im0.copy() if save_crop else im0  # for save_crop
             annotator = Annotator(im0, line_width=line_thickness, example=str(names))
             if len(det):
-                # Rescale boxes from img_size to im0 size
-                det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
+                # Rescale boxes from img_size to im0 size (sliced detections already are in im0 pixels)
+                if slice_tiles:
+                    det[:, :4] = det[:, :4].round()
+                else:
+                    det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
 
                 # Print results
                 for c in det[:, 5].unique():
@@ -355,6 +404,7 @@ def parse_opt():
         --dnn (bool, optional): Flag to use OpenCV DNN for ONNX inference. Defaults to False.
         --vid-stride (int, optional): Video frame-rate stride, determining the number of frames to skip in between
             consecutive frames. Defaults to 1.
+        --decode-workers (int, optional): Processes decoding video files in parallel chunks. Defaults to 0.
 
     Returns:
         argparse.Namespace: Parsed command-line arguments as an argparse.Namespace object.
@@ -400,6 +450,13 @@ def parse_opt():
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
     parser.add_argument("--vid-stride", type=int, default=1, help="video frame-rate stride")
+    parser.add_argument("--reduced-decode", action="store_true", help="decode large JPEGs at reduced resolution")
+    parser.add_argument("--slice-tiles", nargs=2, type=int, default=None, help="sliced inference tile grid rows cols")
+    parser.add_argument("--slice-overlap", type=float, default=0.2, help="sliced inference tile overlap fraction")
+    parser.add_argument(
+        "--no-slice-full-frame", dest="slice_full_frame", action="store_false", help="sliced inference: tiles only"
+    )
+    parser.add_argument("--decode-workers", type=int, default=0, help="parallel video decode processes, 0 to disable")
     opt = parser.parse_args()
     opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
     print_args(vars(opt))
@@ -0,0 +1,181 @@
+"""
+Combined detection + depth API
+
+Serves everything from app.py plus `POST /pipeline/detect_depth`, which decodes
+an upload once, runs YOLOv5 and Depth Anything V2 on the same decoded buffer and
+returns every detection with its depth in one response.
+
+    DEPTH_APP_DIR=../depth-anything-flask-app python fused_app.py
+"""
+
+import importlib.util
+import os
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from flask import Response, request, jsonify
+
+import app as yolo_app
+from app import app, ALLOWED_EXTENSIONS, YOLO_CONFIG, allowed_file
+from serving.responses import image_parts_from_form
+
+# Directory of the Depth Anything V2 Flask app (its app.py, depth_anything_v2/ and checkpoints/)
+DEPTH_APP_DIR = Path(os.getenv('DEPTH_APP_DIR', Path(__file__).resolve().parent.parent / 'depth-anything-flask-app'))
+
+FUSED_CONFIG = {
+    'concurrent': (os.cpu_count() or 1) > 1,  # Run detection and depth at the same time
+    'pipeline_threads': int(os.getenv('THREADS', 8)),  # Depth threads, one per request thread (gunicorn THREADS)
+}
+
+depth_app = None
+# Every concurrent request gets its own depth thread, so none waits for another request's depth (with batching
+# enabled, the depth micro-batcher still merges them into one batch)
+pipeline_pool = ThreadPoolExecutor(max_workers=FUSED_CONFIG['pipeline_threads'], thread_name_prefix='pipeline')
+
+
+def import_depth_app():
+    """Import DEPTH_APP_DIR/app.py as `depth_app`
+
+    Helpers both apps use are in the shared serving package, so the depth app's own modules (colormap, depth_codec,
+    depth_anything_v2, ...) do not clash with this app's. DEPTH_APP_DIR is appended to sys.path so they resolve, also
+    when imported lazily after startup.
+    """
+    if str(DEPTH_APP_DIR) not in sys.path:
+        sys.path.append(str(DEPTH_APP_DIR))
+    spec = importlib.util.spec_from_file_location('depth_app', DEPTH_APP_DIR / 'app.py')
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['depth_app'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_depth_app():
+    """Import the depth app module from DEPTH_APP_DIR under a name that does not clash with app.py"""
+    global depth_app
+
+    try:
+        module = import_depth_app()
+    except Exception as e:
+        print(f"Error importing depth app from {DEPTH_APP_DIR}: {e}")
+        return False
+
+    # Checkpoint path in DEPTH_CONFIG is relative to the depth app directory
+    checkpoint_path = Path(module.DEPTH_CONFIG['checkpoint_path'])
+    if not checkpoint_path.is_absolute():
+        module.DEPTH_CONFIG['checkpoint_path'] = str(DEPTH_APP_DIR / checkpoint_path)
+
+    depth_app = module
+    return depth_app.load_depth_model()
+
+
+def detect_with_depth(image_file, filename, include_images=False, encode=None):
+    """Decode once, run detection and depth on the same buffer and merge the results"""
+    # Large JPEGs are decoded at reduced resolution, but never below either model's input size
+    # (tiled depth and sliced detection need the full resolution)
+    image_bytes = image_file.read()
+    if depth_app.DEPTH_CONFIG['tiled'] or yolo_app.YOLO_CONFIG['slice_tiles']:
+        img_bgr, original_shape = yolo_app.decode_image_bytes(image_bytes)
+    else:
+        img_bgr, original_shape = yolo_app.decode_image(image_bytes, min_short_side=depth_app.DEPTH_CONFIG['input_size'])
+
+    def run_detection(img):
+        img_tensor = None if yolo_app.YOLO_CONFIG['slice_tiles'] else yolo_app.image_to_tensor(img)
+        return yolo_app.process_detections(yolo_app.infer(img_tensor, img), img, img_tensor, original_shape)
+
+    if FUSED_CONFIG['concurrent']:
+        # Depth reads img_bgr while detection draws boxes on its own copy
+        depth_future = pipeline_pool.submit(depth_app.estimate_depth, img_bgr)
+        detections, annotated_image = run_detection(img_bgr.copy())
+        depth_map, depth_uint8 = depth_future.result()
+    else:
+        depth_map, depth_uint8 = depth_app.estimate_depth(img_bgr)
+        detections, annotated_image = run_detection(img_bgr.copy())
+
+    # Depth at the centre of every box, plus robust statistics over the whole box (boxes are in original pixels)
+    midpoints = [{
+        'x': (d['bbox']['x1'] + d['bbox']['x2']) // 2,
+        'y': (d['bbox']['y1'] + d['bbox']['y2']) // 2,
+        'bbox': d['bbox']
+    } for d in detections]
+    for detection, depth_info in zip(detections, depth_app.extract_depth_at_midpoints(depth_map, midpoints, original_shape)):
+        detection['midpoint'] = {'x': depth_info['x'], 'y': depth_info['y']}
+        detection['depth_value'] = depth_info['depth_value']
+        detection['box_depth'] = depth_info['box_depth']
+
+    response_data = {
+        'success': True,
+        'detections': detections,
+        'detection_count': len(detections),
+        'depth_stats': depth_app.compute_depth_stats(depth_map),
+        'image_info': {
+            'filename': filename,
+            'original_size': original_shape,  # (height, width)
+            'processed_size': img_bgr.shape[:2]
+        }
+    }
+
+    if include_images:
+        _, depth_colored = depth_app.create_depth_visualization(img_bgr, depth_uint8)
+        response_data['images'] = {
+            'annotated_image': (encode or yolo_app.encode_image_to_base64)(annotated_image),
+            'depth_colored': (encode or depth_app.encode_image_to_base64)(depth_colored)
+        }
+
+    return response_data
+
+
+@app.route('/pipeline/detect_depth', methods=['POST'])
+def detect_depth():
+    """Object detection and per-object depth from a single upload"""
+    try:
+        if yolo_app.model is None or depth_app is None or depth_app.depth_model is None:
+            return jsonify({'error': 'Models not loaded'}), 500
+
+        if 'image' not in request.files:
+            return jsonify({'error': 'No image file provided'}), 400
+
+        file = request.files['image']
+
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+
+        if not allowed_file(file.filename):
+            return jsonify({
+                'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+            }), 400
+
+        file.seek(0)
+
+        try:
+            image_parts = image_parts_from_form(request.form, YOLO_CONFIG['image_codec'], YOLO_CONFIG['image_quality'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        include_images = request.form.get('include_images', 'false').lower() == 'true'
+        response_data = detect_with_depth(file, file.filename, include_images, encode=image_parts)
+
+        if image_parts is not None:
+            body, content_type = image_parts.multipart(response_data)
+            return Response(body, content_type=content_type), 200
+        return jsonify(response_data), 200
+
+    except Exception as e:
+        print(f"Error in detection + depth pipeline: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': f'Pipeline failed: {str(e)}'}), 500
+
+
+if __name__ == '__main__':
+    print("Starting combined detection + depth API...")
+
+    print("Loading YOLOv5 model...")
+    if not yolo_app.load_yolo_model():
+        print("✗ Failed to load YOLOv5 model - API will not work properly")
+
+    print(f"Loading Depth Anything V2 model from {DEPTH_APP_DIR}...")
+    if not load_depth_app():
+        print("✗ Failed to load depth model - API will not work properly")
+
+    app.run(host='0.0.0.0', port=5000)
@@ -3,8 +3,10 @@
 
 import ast
 import contextlib
+import hashlib
 import json
 import math
+import os
 import platform
 import warnings
 import zipfile
@@ -28,8 +30,6 @@ try:
 
     assert hasattr(ultralytics, "__version__")  # verify package is not directory
 except (ImportError, AssertionError):
-    import os
-
     os.system("pip install -U ultralytics")
     import ultralytics
 
@@ -481,6 +481,8 @@ class DetectMultiBackend(nn.Module):
         fp16 &= pt or jit or onnx or engine or triton  # FP16
         nhwc = coreml or saved_model or pb or tflite or edgetpu  # BHWC formats (vs torch BCWH)
         stride = 32  # default stride
+        compiled = {}  # input shape (None for any shape) -> compiled or frozen PyTorch model, see optimize()
+        eager_shapes = set()  # input shapes warned about running eagerly next to frozen models
         cuda = torch.cuda.is_available() and device.type != "cpu"  # use CUDA
         if not (pt or triton):
             w = attempt_download(w)  # download if not local
@@ -697,7 +699,10 @@ class DetectMultiBackend(nn.Module):
             im = im.permute(0, 2, 3, 1)  # torch BCHW to numpy BHWC shape(1,320,192,3)
 
         if self.pt:  # PyTorch
-            y = self.model(im, augment=augment, visualize=visualize) if augment or visualize else self.model(im)
+            if augment or visualize:
+                y = self.model(im, augment=augment, visualize=visualize)
+            else:
+                y = self._compiled_model(tuple(im.shape))(im)
         elif self.jit:  # TorchScript
             y = self.model(im)
         elif self.dnn:  # ONNX OpenCV DNN
@@ -776,13 +781,81 @@ class DetectMultiBackend(nn.Module):
         """Converts a NumPy array to a torch tensor, maintaining device compatibility."""
         return torch.from_numpy(x).to(self.device) if isinstance(x, np.ndarray) else x
 
-    def warmup(self, imgsz=(1, 3, 640, 640)):
-        """Performs a single inference warmup to initialize model weights, accepting an `imgsz` tuple for image size."""
+    def warmup(self, imgsz=(1, 3, 640, 640), shapes=None):
+        """Performs a single inference warmup to initialize model weights, accepting an `imgsz` tuple for image size, or
+        one per input shape in `shapes` (e.g. every batch size a server forms); compiled models warm up on CPU too.
+        """
         warmup_types = self.pt, self.jit, self.onnx, self.engine, self.saved_model, self.pb, self.triton
-        if any(warmup_types) and (self.device.type != "cpu" or self.triton):
-            im = torch.empty(*imgsz, dtype=torch.half if self.fp16 else torch.float, device=self.device)  # input
-            for _ in range(2 if self.jit else 1):  #
-                self.forward(im)  # warmup
+        if any(warmup_types) and (self.device.type != "cpu" or self.triton or self.compiled):
+            for shape in shapes or [imgsz]:
+                im = torch.empty(*shape, dtype=torch.half if self.fp16 else torch.float, device=self.device)  # input
+                for _ in range(2 if self.jit or self.compiled else 1):  #
+                    self.forward(im)  # warmup
+
+    def optimize(self, mode="compile", shapes=((1, 3, 640, 640),), cache_dir="compile_cache"):
+        """
+        Compiles or freezes a PyTorch model for the given input shapes and warms up each of them, keeping the artifacts
+        in `cache_dir` so restarts skip recompilation.
+
+        Modes:
+            compile: torch.compile, with the TorchInductor cache in `cache_dir` (any input shape).
+            freeze:  TorchScript trace + freeze per input shape, saved as *.torchscript and reloaded on restart; other
+                     shapes run eagerly.
+
+        Other backends are already compiled and are returned unchanged.
+        """
+        if not self.pt or mode in (None, "", "eager"):
+            return self
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        if mode == "compile":
+            assert hasattr(torch, "compile"), "torch.compile requires torch>=2.0"
+            os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str((cache_dir / "inductor").resolve()))
+            with contextlib.suppress(Exception):  # persistent FX graph cache, default on in recent torch
+                torch._inductor.config.fx_graph_cache = True
+            self.compiled[None] = torch.compile(self.model)
+        elif mode == "freeze":
+            for shape in map(tuple, shapes):
+                f = cache_dir / f"{Path(self.w).stem}-{self._compile_key(shape)}.torchscript"
+                if f.exists():
+                    self.compiled[shape] = torch.jit.load(str(f), map_location=self.device)
+                    continue
+                LOGGER.info(f"Freezing {self.w} for input shape {shape}...")
+                im = torch.zeros(*shape, dtype=torch.half if self.fp16 else torch.float, device=self.device)
+                with torch.no_grad(), warnings.catch_warnings():
+                    warnings.filterwarnings("ignore", category=torch.jit.TracerWarning)
+                    ts = torch.jit.freeze(torch.jit.trace(self.model, im, strict=False).eval())
+                torch.jit.save(ts, str(f))
+                self.compiled[shape] = ts
+        else:
+            raise ValueError(f"Invalid optimize mode {mode}, use 'compile' or 'freeze'")
+
+        self.warmup(shapes=shapes)
+        return self
+
+    def _compiled_model(self, shape):
+        """Returns the compiled or frozen model for an input shape, or the eager model with a one-time warning when
+        only other shapes were frozen.
+        """
+        model = self.compiled.get(shape, self.compiled.get(None))
+        if model is not None:
+            return model
+        if self.compiled and shape not in self.eager_shapes:
+            self.eager_shapes.add(shape)
+            LOGGER.warning(f"WARNING ⚠️ No frozen model for input shape {shape}, running it eagerly")
+        return self.model
+
+    def _compile_key(self, shape):
+        """Returns a short hash of everything a frozen model depends on: weights file, input shape, device, precision,
+        torch version and Detect head settings.
+        """
+        st = Path(self.w).stat()
+        m = getattr(self.model, "model", [None])[-1]  # Detect()
+        head = [getattr(m, k, None) for k in ("prefilter", "prefilter_conf", "prefilter_topk")]
+        key = [Path(self.w).resolve(), st.st_size, st.st_mtime_ns, shape, self.device, self.fp16, torch.__version__]
+        key += head
+        return hashlib.md5(str(key).encode()).hexdigest()[:16]
 
     @staticmethod
     def _model_type(p="path/to/model.pt"):
@@ -75,6 +75,9 @@ class Detect(nn.Module):
     stride = None  # strides computed during build
     dynamic = False  # force grid reconstruction
     export = False  # export mode
+    prefilter = False  # inference: decode only the top-k most confident anchors per scale, see _prefilter()
+    prefilter_conf = 0.25  # objectness threshold of the prefilter (match the NMS conf_thres)
+    prefilter_topk = 1000  # max candidates per scale and image
 
     def __init__(self, nc=80, anchors=(), ch=(), inplace=True):
         """Initializes YOLOv5 detection layer with specified classes, anchors, channels, and inplace operations."""
@@ -101,6 +104,10 @@ class Detect(nn.Module):
                 if self.dynamic or self.grid[i].shape[2:4] != x[i].shape[2:4]:
                     self.grid[i], self.anchor_grid[i] = self._make_grid(nx, ny, i)
 
+                if self.prefilter:  # compact candidate list instead of every anchor
+                    z.append(self._prefilter(x[i], i))
+                    continue
+
                 if isinstance(self, Segment):  # (boxes + masks)
                     xy, wh, conf, mask = x[i].split((2, 2, self.nc + 1, self.no - self.nc - 5), 4)
                     xy = (xy.sigmoid() * 2 + self.grid[i]) * self.stride[i]  # xy
@@ -115,6 +122,29 @@ class Detect(nn.Module):
 
         return x if self.training else (torch.cat(z, 1),) if self.export else (torch.cat(z, 1), x)
 
+    def _prefilter(self, p, i):
+        """Selects the `prefilter_topk` anchors with the highest objectness from raw output `p(bs,na,ny,nx,no)` of layer
+        `i` and decodes only those, returning `(bs, k, no)` candidates; candidates below `prefilter_conf` get zero
+        confidence so NMS drops them.
+        """
+        bs, na, ny, nx, no = p.shape
+        p = p.view(bs, na * ny * nx, no)
+        k = min(self.prefilter_topk, p.shape[1])
+        idx = p[..., 4].topk(k, dim=1, sorted=False)[1]  # on logits, sigmoid is monotonic
+        p = p.gather(1, idx[..., None].expand(-1, -1, no))
+
+        # Grid cell and anchor of every candidate
+        a, cell = idx // (ny * nx), idx % (ny * nx)
+        grid = torch.stack((cell % nx, cell // nx), -1).to(p.dtype) - 0.5
+        anchor_grid = (self.anchors[i] * self.stride[i])[a].to(p.dtype)
+
+        xy, wh, conf, mask = p.split((2, 2, self.nc + 1, no - self.nc - 5), 2)  # mask is empty for Detect
+        xy = (xy.sigmoid() * 2 + grid) * self.stride[i]  # xy
+        wh = (wh.sigmoid() * 2) ** 2 * anchor_grid  # wh
+        conf = conf.sigmoid()
+        conf = conf * (conf[..., :1] > self.prefilter_conf)  # objectness threshold
+        return torch.cat((xy, wh, conf, mask), 2)
+
     def _make_grid(self, nx=20, ny=20, i=0, torch_1_10=check_version(torch.__version__, "1.10.0")):
         """Generates a mesh grid for anchor boxes with optional compatibility for torch versions < 1.10."""
         d = self.anchors[i].device
@@ -0,0 +1,259 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""
+Post-training INT8 quantization of a YOLOv5 model for CPU inference with ONNX Runtime.
+
+Exports the model to ONNX with dynamic axes, calibrates activation ranges on a local image folder and writes a QDQ
+INT8 model next to the weights. The INT8 model loads like any other ONNX model: `detect.py --weights yolov5s_int8.onnx`
+or `YOLO_CONFIG['weights'] = 'yolov5s_int8.onnx'` in app.py. Conv and MatMul layers are quantized; the Detect head's
+box decoding stays in FP32.
+
+The FP32 and INT8 models are then compared with `ap_per_class`: on a labelled dataset with --data, otherwise against
+the FP32 detections on the calibration images (INT8 agreement with FP32).
+
+Requirements:
+    $ pip install onnx onnxruntime
+
+Usage:
+    $ python quantize.py --weights yolov5s.pt --calib-dir data/images
+    $ python quantize.py --weights yolov5s.pt --calib-dir datasets/coco128/images/train2017 --data data/coco128.yaml
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
+
+import export
+from models.common import DetectMultiBackend
+from utils.augmentations import letterbox
+from utils.dataloaders import IMG_FORMATS, create_dataloader
+from utils.general import (
+    LOGGER,
+    check_dataset,
+    check_requirements,
+    check_yaml,
+    colorstr,
+    cv2,
+    non_max_suppression,
+    print_args,
+    xywh2xyxy,
+)
+from utils.metrics import ap_per_class, box_iou
+
+
+def load_image(path, imgsz=640):
+    """Reads an image and preprocesses it like the Flask app: square letterbox, RGB, CHW, 0-1, batch axis."""
+    im = letterbox(cv2.imread(str(path)), imgsz, stride=32, auto=False)[0]
+    im = im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
+    return np.ascontiguousarray(im, dtype=np.float32)[None] / 255
+
+
+class CalibrationReader:
+    """ONNX Runtime calibration data reader feeding preprocessed images from a list of files one at a time."""
+
+    def __init__(self, files, input_name, imgsz=640):
+        self.files, self.input_name, self.imgsz = files, input_name, imgsz
+        self.rewind()
+
+    def get_next(self):
+        f = next(self.iter, None)
+        return None if f is None else {self.input_name: load_image(f, self.imgsz)}
+
+    def rewind(self):
+        self.iter = iter(self.files)
+
+
+def quantize_onnx(f, f_int8, reader, method="minmax", per_channel=True, prefix=colorstr("INT8:")):
+    """
+    Statically quantizes an ONNX model to INT8 (QDQ format) with activation ranges calibrated on `reader`.
+
+    Args:
+        f (Path): FP32 ONNX model.
+        f_int8 (Path): Output INT8 ONNX model.
+        reader (CalibrationReader): Calibration inputs.
+        method (str): Activation range calibration, 'minmax', 'entropy' or 'percentile'.
+        per_channel (bool): Per output channel weight scales (more accurate, same speed on CPU).
+        prefix (str): Log prefix.
+
+    Returns:
+        (Path): The INT8 model. Model metadata (stride, names) is copied from the FP32 model.
+    """
+    check_requirements(("onnx", "onnxruntime"))
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    LOGGER.info(f"\n{prefix} calibrating {f} on {len(reader.files)} images ({method})...")
+    f_pre = f.with_name(f"{f.stem}-preprocessed.onnx")
+    quant_pre_process(str(f), str(f_pre))  # shape inference and graph optimization, recommended before quantizing
+    quantize_static(
+        str(f_pre),
+        str(f_int8),
+        reader,
+        quant_format=QuantFormat.QDQ,
+        op_types_to_quantize=["Conv", "MatMul"],
+        per_channel=per_channel,
+        calibrate_method={
+            "minmax": CalibrationMethod.MinMax,
+            "entropy": CalibrationMethod.Entropy,
+            "percentile": CalibrationMethod.Percentile,
+        }[method],
+    )
+    f_pre.unlink()
+
+    # Metadata DetectMultiBackend reads stride and class names from
+    model, model_int8 = onnx.load(str(f)), onnx.load(str(f_int8))
+    del model_int8.metadata_props[:]
+    model_int8.metadata_props.extend(model.metadata_props)
+    onnx.save(model_int8, str(f_int8))
+
+    LOGGER.info(f"{prefix} saved {f_int8} ({f_int8.stat().st_size / 1e6:.1f} MB, FP32 {f.stat().st_size / 1e6:.1f} MB)")
+    return f_int8
+
+
+def process_batch(detections, labels, iouv):
+    """Returns a (n, len(iouv)) bool array of detections (x1, y1, x2, y2, conf, cls) matching labels (cls, x1, y1, x2,
+    y2) at each IoU threshold, as in YOLOv5 val.py.
+    """
+    correct = np.zeros((detections.shape[0], iouv.shape[0])).astype(bool)
+    iou = box_iou(labels[:, 1:], detections[:, :4])
+    correct_class = labels[:, 0:1] == detections[:, 5]
+    for i in range(len(iouv)):
+        x = torch.where((iou >= iouv[i]) & correct_class)  # IoU > threshold and classes match
+        if x[0].shape[0]:
+            matches = torch.cat((torch.stack(x, 1), iou[x[0], x[1]][:, None]), 1).cpu().numpy()  # [label, det, iou]
+            if x[0].shape[0] > 1:
+                matches = matches[matches[:, 2].argsort()[::-1]]
+                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+            correct[matches[:, 1].astype(int), i] = True
+    return torch.tensor(correct, dtype=torch.bool, device=iouv.device)
+
+
+def evaluate(model, samples, conf_thres=0.001, iou_thres=0.6, max_det=300):
+    """
+    Computes detection metrics of `model` on (image, labels) samples with `ap_per_class`.
+
+    Returns:
+        (tuple): Mean precision, recall, mAP@0.5, mAP@0.5:0.95 and the mean inference time per image in ms.
+    """
+    iouv = torch.linspace(0.5, 0.95, 10)  # IoU thresholds for mAP@0.5:0.95
+    stats, dt = [], 0.0
+    for im, labels in samples:
+        t = time.perf_counter()
+        pred = model(torch.from_numpy(im))
+        dt += time.perf_counter() - t
+        pred = non_max_suppression(pred, conf_thres, iou_thres, max_det=max_det)[0]
+        correct = process_batch(pred, labels, iouv) if len(labels) else torch.zeros(len(pred), len(iouv), dtype=bool)
+        stats.append((correct, pred[:, 4], pred[:, 5], labels[:, 0]))
+
+    tp, conf, pred_cls, target_cls = (torch.cat(x, 0).cpu().numpy() for x in zip(*stats))
+    if not tp.any():
+        return 0.0, 0.0, 0.0, 0.0, dt / len(samples) * 1e3
+    _, _, p, r, _, ap, _ = ap_per_class(tp, conf, pred_cls, target_cls)
+    return p.mean(), r.mean(), ap[:, 0].mean(), ap.mean(1).mean(), dt / len(samples) * 1e3
+
+
+def dataset_samples(data, imgsz=640, task="val"):
+    """Yields (image, labels) samples of a labelled dataset, labels as (cls, x1, y1, x2, y2) in input pixels."""
+    data = check_dataset(check_yaml(data))
+    dataloader = create_dataloader(data[task], imgsz, 1, 32, pad=0.5, workers=0, prefix=colorstr(f"{task}: "))[0]
+    for im, targets, _, _ in dataloader:
+        _, _, height, width = im.shape
+        boxes = xywh2xyxy(targets[:, 2:] * torch.tensor((width, height, width, height)))
+        yield im.float().numpy() / 255, torch.cat((targets[:, 1:2], boxes), 1)
+
+
+def reference_samples(model, files, imgsz=640, conf_thres=0.25, iou_thres=0.45):
+    """Pseudo-labelled (image, labels) samples: the detections of the reference `model` become the labels."""
+    samples = []
+    for f in files:
+        im = load_image(f, imgsz)
+        pred = non_max_suppression(model(torch.from_numpy(im)), conf_thres, iou_thres)[0]
+        samples.append((im, torch.cat((pred[:, 5:6], pred[:, :4]), 1)))
+    return samples
+
+
+def run(
+    weights=ROOT / "yolov5s.pt",  # PyTorch weights or FP32 ONNX model
+    calib_dir=ROOT / "data/images",  # calibration image folder
+    calib_images=300,  # max calibration images
+    data="",  # optional dataset.yaml for labelled mAP
+    imgsz=640,  # calibration and evaluation image size
+    method="minmax",  # activation calibration: minmax, entropy or percentile
+    per_tensor=False,  # per-tensor instead of per-channel weight scales
+    opset=17,  # ONNX opset of the exported FP32 model
+):
+    """Exports, quantizes and evaluates a YOLOv5 model, returns the INT8 ONNX model path."""
+    check_requirements(("onnx", "onnxruntime"))
+    weights = Path(weights)
+    files = sorted(p for p in Path(calib_dir).rglob("*.*") if p.suffix[1:].lower() in IMG_FORMATS)[:calib_images]
+    assert files, f"No images found in {calib_dir}. Supported formats are: {IMG_FORMATS}"
+
+    # FP32 ONNX with dynamic batch/height/width, so the Flask micro-batcher and rectangular inputs work
+    if weights.suffix == ".onnx":
+        f = weights
+    else:
+        f = Path(export.run(weights=weights, imgsz=(imgsz, imgsz), include=("onnx",), dynamic=True, opset=opset)[0])
+
+    import onnx
+
+    input_name = onnx.load(str(f)).graph.input[0].name
+    f_int8 = f.with_name(f"{f.stem}_int8.onnx")
+    quantize_onnx(f, f_int8, CalibrationReader(files, input_name, imgsz), method, not per_tensor)
+
+    # Accuracy and latency, FP32 vs INT8 on CPU
+    device = torch.device("cpu")
+    fp32, int8 = DetectMultiBackend(str(f), device=device), DetectMultiBackend(str(f_int8), device=device)
+    if data:
+        samples, reference = list(dataset_samples(data, imgsz)), "labels"
+    else:
+        samples, reference = reference_samples(fp32, files, imgsz), "FP32 detections"
+    LOGGER.info(f"\n{colorstr('INT8:')} evaluating on {len(samples)} images against {reference}")
+    LOGGER.info(("%10s" * 6) % ("Model", "P", "R", "mAP50", "mAP50-95", "ms/img"))
+    results = {"FP32": evaluate(fp32, samples), "INT8": evaluate(int8, samples)}
+    for name, (p, r, map50, map, ms) in results.items():
+        LOGGER.info(("%10s" + "%10.3g" * 4 + "%10.1f") % (name, p, r, map50, map, ms))
+    (_, _, map50_fp32, map_fp32, ms_fp32), (_, _, map50_int8, map_int8, ms_int8) = results.values()
+    LOGGER.info(
+        f"{'delta':>10}{'':>20}{map50_int8 - map50_fp32:+10.3g}{map_int8 - map_fp32:+10.3g}"
+        f"{'':>4}x{ms_fp32 / max(ms_int8, 1e-9):.2f} speed"
+    )
+    return f_int8
+
+
+def parse_opt():
+    """Parses command-line arguments for YOLOv5 INT8 quantization."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", type=str, default=ROOT / "yolov5s.pt", help="PyTorch weights or FP32 ONNX model")
+    parser.add_argument("--calib-dir", type=str, default=ROOT / "data/images", help="calibration image folder")
+    parser.add_argument("--calib-images", type=int, default=300, help="max calibration images")
+    parser.add_argument("--data", type=str, default="", help="dataset.yaml for mAP on labels (default: vs FP32)")
+    parser.add_argument("--imgsz", "--img", "--img-size", type=int, default=640, help="image size")
+    parser.add_argument("--method", default="minmax", choices=["minmax", "entropy", "percentile"], help="calibration")
+    parser.add_argument("--per-tensor", action="store_true", help="per-tensor weight scales")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX: opset version")
+    opt = parser.parse_args()
+    print_args(vars(opt))
+    return opt
+
+
+def main(opt):
+    """Runs INT8 quantization with the parsed command-line options."""
+    check_requirements(ROOT / "requirements.txt", exclude=("tensorboard", "thop"))
+    run(**vars(opt))
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
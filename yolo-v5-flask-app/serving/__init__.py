@@ -0,0 +1,7 @@
+"""
+Serving helpers shared by the YOLOv5 and Depth Anything V2 apps
+
+Micro-batching, upload decoding, response encoding, the result cache and the
+gunicorn worker setup. The depth app imports this package from the YOLOv5 app
+directory (see its serving_path.py), so there is one copy of each helper.
+"""
@@ -0,0 +1,106 @@
+"""
+Dynamic micro-batching for concurrent inference requests
+
+Request threads submit one item each; a background worker gathers whatever
+arrives within a short window into one batch, runs a single batched call and
+hands each request its own result back.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Gather concurrent requests into batched calls of `process_batch`"""
+
+    def __init__(self, process_batch, max_batch_size=8, max_wait_ms=10, bucket_key=None, name='micro-batcher'):
+        # process_batch(items) -> list of results, one per item, in the same order
+        # bucket_key(item) -> hashable; only items with equal keys share a batch
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.bucket_key = bucket_key
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+
+    def submit(self, item, timeout=None):
+        """Queue a single item and block until its result is ready"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout)
+
+    def stats(self):
+        """Return batching counters for monitoring endpoints"""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': self._batches,
+            'items': self._items,
+            'mean_batch_size': round(self._items / self._batches, 2) if self._batches else 0.0,
+            'largest_batch': self._largest_batch,
+            'queued': self._queue.qsize()
+        }
+
+    def _ensure_worker(self):
+        """Start the worker thread lazily on first use"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _buckets(self, batch):
+        """Split a gathered batch into groups that can share one call"""
+        if self.bucket_key is None:
+            return [batch]
+        buckets = {}
+        for entry in batch:
+            buckets.setdefault(self.bucket_key(entry[0]), []).append(entry)
+        return list(buckets.values())
+
+    def _dispatch(self, group):
+        """Run one batched call and resolve the futures of its requests"""
+        items = [item for item, _ in group]
+        try:
+            results = self.process_batch(items)
+            if len(results) != len(items):
+                raise RuntimeError(f'{self.name}: expected {len(items)} results, got {len(results)}')
+        except Exception as e:
+            for _, future in group:
+                future.set_exception(e)
+            return
+
+        self._batches += 1
+        self._items += len(items)
+        self._largest_batch = max(self._largest_batch, len(items))
+        for (_, future), result in zip(group, results):
+            future.set_result(result)
+
+    def _run(self):
+        """Worker loop"""
+        while True:
+            for group in self._buckets(self._collect()):
+                self._dispatch(group)
@@ -0,0 +1,59 @@
+"""
+Gunicorn settings shared by both apps' gunicorn.conf.py
+
+Environment overrides:
+    WORKERS         number of pre-forked worker processes (default: one per 4 cores)
+    THREADS         request threads per worker, feeding the micro-batcher (default 8)
+    TIMEOUT         worker timeout in seconds (default 120)
+    TORCH_THREADS   torch intra-op threads per worker (default: cores in the worker's slice)
+    PIN_CPUS        '1' to pin each worker to a disjoint slice of cores (default '1')
+"""
+
+import multiprocessing
+import os
+
+workers = int(os.getenv('WORKERS', max(1, multiprocessing.cpu_count() // 4)))
+worker_class = 'gthread'
+threads = int(os.getenv('THREADS', 8))
+timeout = int(os.getenv('TIMEOUT', 120))
+
+# Load the model once in the master, then fork workers that share its memory
+preload_app = True
+
+
+# CPU slot -> worker holding it, kept in the master: slots are taken in pre_fork and freed in child_exit
+worker_slots = {}
+
+
+def pre_fork(server, worker):
+    """Reserve the first free CPU slot for the worker about to be forked, so a respawned worker takes the dead one's"""
+    worker.slot = next(slot for slot in range(len(worker_slots) + 1) if slot not in worker_slots)
+    worker_slots[worker.slot] = worker
+
+
+def child_exit(server, worker):
+    """Free the slot of a worker that exited"""
+    slot = getattr(worker, 'slot', None)
+    if worker_slots.get(slot) is worker:
+        del worker_slots[slot]
+
+
+def post_fork(server, worker):
+    """Give each worker its CPU slice"""
+    configure_worker(worker.slot % server.cfg.workers, server.cfg.workers)
+
+
+def configure_worker(index, num_workers):
+    """Pin a forked worker to its own slice of CPU cores and size torch's thread pool to match"""
+    import torch
+
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    per_worker = max(1, len(cpus) // max(1, num_workers))
+    cores = cpus[index * per_worker:(index + 1) * per_worker] or cpus
+
+    if os.getenv('PIN_CPUS', '1') == '1' and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    num_threads = int(os.getenv('TORCH_THREADS', len(cores)))
+    torch.set_num_threads(num_threads)
+    print(f"Worker {index} (pid {os.getpid()}): cores {cores}, torch threads {num_threads}")
@@ -0,0 +1,56 @@
+"""
+Reduced-resolution decoding of oversized uploads
+
+JPEG stores 8x8 DCT blocks, so libjpeg can decode straight to 1/2, 1/4 or 1/8
+scale for a fraction of the cost of a full decode (OpenCV's IMREAD_REDUCED_*
+flags). `decode_image` picks the largest factor that still leaves the image at
+least as large as the model input and returns the original (height, width)
+next to the decoded image, so coordinates can be mapped back to the upload.
+"""
+
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# JPEG scale denominator -> OpenCV flag, largest reduction first
+JPEG_REDUCED_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+
+
+def reduction_factor(shape, min_long_side=0, min_short_side=0):
+    """Largest JPEG scale denominator (8, 4, 2 or 1) keeping both sides of a (height, width) shape large enough"""
+    long_side, short_side = max(shape), min(shape)
+    for factor in JPEG_REDUCED_FLAGS:
+        if long_side // factor >= min_long_side and short_side // factor >= min_short_side:
+            return factor
+    return 1
+
+
+def decode_image(image_bytes, min_long_side=0, min_short_side=0):
+    """Decode image bytes to BGR, returns (img_bgr, original (height, width))
+
+    JPEGs are decoded at the largest reduction that keeps the long side at least
+    min_long_side and the short side at least min_short_side pixels; with both
+    at 0 every image is decoded at full resolution. EXIF orientation is ignored.
+    """
+    flags = cv2.IMREAD_COLOR
+    original_shape = None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:  # parses the header only
+            if image.format == 'JPEG' and (min_long_side or min_short_side):
+                original_shape = image.height, image.width
+                factor = reduction_factor(original_shape, min_long_side, min_short_side)
+                flags = JPEG_REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR)
+    except OSError:
+        pass  # not an image PIL recognizes, let OpenCV try
+
+    # Decode from the upload buffer without copying it
+    img_bgr = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img_bgr is None:
+        # Formats OpenCV cannot decode (e.g. GIF)
+        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        img_bgr = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+        original_shape = None
+
+    return img_bgr, tuple(original_shape or img_bgr.shape[:2])
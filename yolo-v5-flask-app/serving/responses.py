@@ -0,0 +1,89 @@
+"""
+Binary response mode
+
+Images are encoded straight from the OpenCV buffer with `cv2.imencode` and sent
+as separate parts of a multipart/mixed response next to the JSON metadata,
+instead of being base64-expanded into the JSON body. In the JSON part, each
+image (or other binary) field holds a `cid:<name>` reference to the part with
+that Content-ID.
+"""
+
+import json
+import uuid
+
+import cv2
+
+# codec -> (file extension, mime type, OpenCV quality flag)
+IMAGE_CODECS = {
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+    'png': ('.png', 'image/png', cv2.IMWRITE_PNG_COMPRESSION),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+def encode_image(img_array, codec='jpeg', quality=90):
+    """Encode a BGR or single-channel image; quality is 0-100 (jpeg/webp) or compression level 0-9 (png)"""
+    if codec not in IMAGE_CODECS:
+        raise ValueError(f'Unsupported image codec: {codec}. Supported: {", ".join(IMAGE_CODECS)}')
+    ext, _, flag = IMAGE_CODECS[codec]
+    quality = min(9, max(0, int(quality))) if codec == 'png' else min(100, max(0, int(quality)))
+
+    ok, buffer = cv2.imencode(ext, img_array, [flag, quality])
+    if not ok:
+        raise ValueError(f'Failed to encode image as {codec}')
+    return buffer.tobytes()
+
+
+class ImageParts:
+    """Collects encoded images for a multipart response; use it wherever encode_image_to_base64 is expected"""
+
+    def __init__(self, codec='jpeg', quality=90):
+        if codec not in IMAGE_CODECS:
+            raise ValueError(f'Unsupported image codec: {codec}. Supported: {", ".join(IMAGE_CODECS)}')
+        self.codec = codec
+        self.quality = quality
+        self.parts = []
+
+    def __call__(self, img_array):
+        return self.add_bytes(encode_image(img_array, self.codec, self.quality), IMAGE_CODECS[self.codec][1], 'image')
+
+    def add_bytes(self, data, mime='application/octet-stream', prefix='data'):
+        """Attach an already encoded binary payload, returns its cid reference"""
+        name = f'{prefix}-{len(self.parts) + 1}'
+        self.parts.append((name, mime, data))
+        return f'cid:{name}'
+
+    def multipart(self, payload):
+        """Build a multipart/mixed body: JSON metadata first, then one part per image or binary payload"""
+        boundary = uuid.uuid4().hex
+        metadata = json.dumps(payload).encode('utf-8')
+
+        chunks = [
+            f'--{boundary}\r\nContent-Type: application/json\r\nContent-ID: <metadata>\r\n'
+            f'Content-Length: {len(metadata)}\r\n\r\n'.encode('ascii'),
+            metadata,
+        ]
+        for name, mime, data in self.parts:
+            chunks.append(
+                f'\r\n--{boundary}\r\nContent-Type: {mime}\r\nContent-ID: <{name}>\r\n'
+                f'Content-Length: {len(data)}\r\n\r\n'.encode('ascii')
+            )
+            chunks.append(data)
+        chunks.append(f'\r\n--{boundary}--\r\n'.encode('ascii'))
+
+        return b''.join(chunks), f'multipart/mixed; boundary={boundary}'
+
+
+def image_parts_from_form(form, default_codec='jpeg', default_quality=90):
+    """ImageParts for requests with response_format=multipart, None for plain JSON; ValueError on bad options"""
+    response_format = form.get('response_format', 'json').lower()
+    if response_format == 'json':
+        return None
+    if response_format != 'multipart':
+        raise ValueError(f'Invalid response_format: {response_format}. Use json or multipart')
+
+    try:
+        quality = int(form.get('image_quality', default_quality))
+    except ValueError:
+        raise ValueError('image_quality must be an integer')
+    return ImageParts(form.get('image_codec', default_codec).lower(), quality)
@@ -0,0 +1,193 @@
+"""
+Content-addressed cache for inference results
+
+Results are keyed by a fast hash of the uploaded bytes plus the inference
+config, so byte-identical re-submissions skip the model entirely. The memory
+tier is an LRU bounded by a byte budget with a per-entry TTL. The optional disk
+tier (e.g. a directory under /dev/shm) is shared by every worker process on the
+host; entries are pickled, so only point it at a directory the service owns.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+try:
+    import xxhash  # optional, faster than blake2b for large uploads
+except ImportError:
+    xxhash = None
+
+
+def estimate_size(value):
+    """Approximate memory footprint in bytes of arrays, tensors and containers of them"""
+    if hasattr(value, 'nbytes'):  # numpy
+        return int(value.nbytes)
+    if hasattr(value, 'element_size') and hasattr(value, 'nelement'):  # torch
+        return int(value.element_size() * value.nelement())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value) + 64
+    if isinstance(value, dict):
+        return sum(estimate_size(v) for v in value.values()) + 64
+    return 64
+
+
+def freeze(value):
+    """Make numpy arrays in a value (and containers of them) read-only, returns the value"""
+    if hasattr(value, 'setflags'):  # numpy
+        value.setflags(write=False)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            freeze(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            freeze(v)
+    return value
+
+
+class ResultCache:
+    """LRU/TTL result cache with a byte budget and an optional shared on-disk tier"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl_s=600, disk_dir=None, disk_max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl_s)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = int(disk_max_bytes)
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        self._entries = OrderedDict()  # key -> (expires_at, nbytes, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self._counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(data, config):
+        """Key from the raw upload bytes and the config that produced the result"""
+        digest = xxhash.xxh3_128_hexdigest(data) if xxhash is not None else hashlib.blake2b(data, digest_size=16).hexdigest()
+        config_digest = hashlib.blake2b(json.dumps(config, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+        return f'{digest}-{config_digest}'
+
+    def get(self, key):
+        """Cached value or None; checks memory first, then the disk tier"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return entry[2]
+                self._remove(key)
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['disk_hits'] += 1
+        self._memory_put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store a value in memory and, when configured, on disk
+
+        Cached numpy arrays are shared between requests, so they are made read-only here and when loaded from disk:
+        accidental in-place edits fail loudly on either tier.
+        """
+        freeze(value)
+        self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def stats(self):
+        """Hit/miss counters for monitoring endpoints"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['disk_hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': round((lookups - self._counters['misses']) / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_s': self.ttl,
+                'disk_dir': str(self.disk_dir) if self.disk_dir else None
+            }
+
+    def _memory_put(self, key, value):
+        nbytes = estimate_size(value)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, nbytes, value)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def _remove(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    def _disk_path(self, key):
+        return self.disk_dir / key[:2] / f'{key}.pkl'
+
+    def _disk_get(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, 'rb') as f:
+                return freeze(pickle.load(f))
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _disk_put(self, key, value):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Write then rename, so other workers never read a partial file
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Warning: result cache disk write failed: {e}")
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % 100 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Drop expired files, then the oldest ones until the disk tier fits its budget"""
+        files = []
+        now = time.time()
+        for path in self.disk_dir.glob('*/*.pkl'):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                files.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
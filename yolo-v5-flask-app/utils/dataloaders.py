@@ -10,6 +10,7 @@ import os
 import random
 import shutil
 import time
+from collections import deque
 from itertools import repeat
 from multiprocessing.pool import Pool, ThreadPool
 from pathlib import Path
@@ -56,6 +57,7 @@ from utils.general import (
     xyxy2xywhn,
 )
 from utils.torch_utils import torch_distributed_zero_first
+from utils.video_decode import VideoDecoder
 
 # Parameters
 HELP_URL = "See https://docs.ultralytics.com/yolov5/tutorials/train_custom_data"
@@ -90,6 +92,25 @@ def exif_size(img):
     return s
 
 
+def imread_reduced(path, min_size=640):
+    """Reads a BGR image, decoding JPEGs at the largest 1/2, 1/4 or 1/8 DCT scale that keeps the long side >= min_size;
+    returns the image and its original (height, width).
+    """
+    flags, shape = cv2.IMREAD_COLOR, None
+    with contextlib.suppress(Exception):
+        with Image.open(path) as img:  # header only
+            w, h = exif_size(img)  # cv2.imread applies EXIF orientation too
+            shape = h, w
+            if img.format == "JPEG":
+                reduced = (8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)
+                for factor, flag in reduced:
+                    if max(h, w) // factor >= min_size:
+                        flags = flag
+                        break
+    im = cv2.imread(path, flags)
+    return im, shape or (im.shape[:2] if im is not None else None)
+
+
 def exif_transpose(image):
     """
     Transpose a PIL image accordingly if it has an EXIF Orientation tag.
@@ -322,8 +343,24 @@ class LoadScreenshots:
 class LoadImages:
     """YOLOv5 image/video dataloader, i.e. `python detect.py --source image.jpg/vid.mp4`."""
 
-    def __init__(self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
-        """Initializes YOLOv5 loader for images/videos, supporting glob patterns, directories, and lists of paths."""
+    def __init__(
+        self,
+        path,
+        img_size=640,
+        stride=32,
+        auto=True,
+        transforms=None,
+        vid_stride=1,
+        reduced_decode=False,
+        decode_workers=0,
+    ):
+        """Initializes YOLOv5 loader for images/videos, supporting glob patterns, directories, and lists of paths.
+
+        With reduced_decode, large JPEGs are decoded at reduced resolution (never below img_size on the long side), so
+        im0 is smaller than the file; the original (height, width) of the last image is kept in `shape0`. With
+        decode_workers, videos are read by a VideoDecoder that decodes chunks in that many processes and seeks over
+        large strides (see utils/video_decode.py); frames still come in order.
+        """
         if isinstance(path, str) and Path(path).suffix == ".txt":  # *.txt file with img/vid/dir on each line
             path = Path(path).read_text().rsplit()
         files = []
@@ -351,6 +388,9 @@ class LoadImages:
         self.auto = auto
         self.transforms = transforms  # optional
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.reduced_decode = reduced_decode  # DCT-domain downscaled JPEG decoding
+        self.decode_workers = decode_workers  # parallel video decode processes, 0 for a single cv2.VideoCapture
+        self.shape0 = None  # original (height, width) of the last image
         if any(videos):
             self._new_video(videos[0])  # new video
         else:
@@ -373,9 +413,12 @@ class LoadImages:
         if self.video_flag[self.count]:
             # Read video
             self.mode = "video"
-            for _ in range(self.vid_stride):
-                self.cap.grab()
-            ret_val, im0 = self.cap.retrieve()
+            if self.decode_workers:
+                ret_val, im0 = self.cap.read()  # VideoDecoder, strided already
+            else:
+                for _ in range(self.vid_stride):
+                    self.cap.grab()
+                ret_val, im0 = self.cap.retrieve()
             while not ret_val:
                 self.count += 1
                 self.cap.release()
@@ -392,7 +435,12 @@ class LoadImages:
         else:
             # Read image
             self.count += 1
-            im0 = cv2.imread(path)  # BGR
+            if self.reduced_decode:
+                min_size = max(self.img_size) if isinstance(self.img_size, (list, tuple)) else self.img_size
+                im0, self.shape0 = imread_reduced(path, min_size)  # BGR
+            else:
+                im0 = cv2.imread(path)  # BGR
+                self.shape0 = None if im0 is None else im0.shape[:2]
             assert im0 is not None, f"Image Not Found {path}"
             s = f"image {self.count}/{self.nf} {path}: "
 
@@ -410,7 +458,10 @@ class LoadImages:
         metadata.
         """
         self.frame = 0
-        self.cap = cv2.VideoCapture(path)
+        if self.decode_workers:
+            self.cap = VideoDecoder(path, self.vid_stride, self.decode_workers)
+        else:
+            self.cap = cv2.VideoCapture(path)
         self.frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) / self.vid_stride)
         self.orientation = int(self.cap.get(cv2.CAP_PROP_ORIENTATION_META))  # rotation degrees
         # self.cap.set(cv2.CAP_PROP_ORIENTATION_AUTO, 0)  # disable https://github.com/ultralytics/yolov5/issues/8493
@@ -430,22 +481,115 @@ class LoadImages:
         return self.nf  # number of files
 
 
+class FrameRing:
+    """
+    Preallocated ring of frames handed from one stream reader thread (producer) to the loader (consumer).
+
+    Frames are decoded straight into free slots and published with a sequence number and timestamp. Slot indices move
+    between the `free` and `ready` deques, whose append/pop are atomic under the GIL, so no lock is taken and a slot is
+    never written while it is published or held by the consumer. With policy "latest" the producer recycles the oldest
+    unread frame when no slot is free and the consumer takes only the newest frame; with "all" the producer waits for a
+    free slot and the consumer takes every frame in order. Frames never returned to the consumer count as `dropped`.
+    """
+
+    def __init__(self, shape, size=4, policy="latest"):
+        """Allocates `size` frames of `shape` (h, w, 3); size >= 3 keeps a slot free for the producer at all times."""
+        assert policy in {"latest", "all"}, f"invalid ring policy '{policy}', valid policies are 'latest' and 'all'"
+        assert size >= 3, f"ring size {size} < 3"
+        self.frames = np.zeros((size, *shape), dtype=np.uint8)
+        self.seq = np.zeros(size, dtype=np.int64)  # sequence number of the frame in each slot, from 1
+        self.ts = np.zeros(size)  # its capture time
+        self.free, self.ready = deque(range(size)), deque()
+        self.held = None  # slot returned by the last get(), valid until the next one
+        self.policy = policy
+        self.published = 0  # frames published by the producer
+        self.overwritten = 0  # unread frames recycled by the producer (policy 'latest')
+        self.skipped = 0  # unread frames superseded by a newer one in get() (policy 'latest')
+
+    @property
+    def dropped(self):
+        """Frames published but never returned by get(), the counters are written by one thread each."""
+        return self.overwritten + self.skipped
+
+    def slot(self):
+        """Producer: returns the index of a slot to write the next frame into, or None if none is available."""
+        with contextlib.suppress(IndexError):
+            return self.free.popleft()
+        if self.policy == "latest":
+            with contextlib.suppress(IndexError):  # the consumer may have taken it in the meantime
+                i = self.ready.popleft()
+                self.overwritten += 1
+                return i
+        return None
+
+    def publish(self, i, ts=None):
+        """Producer: makes the frame written into slot `i` available to the consumer."""
+        self.published += 1
+        self.seq[i], self.ts[i] = self.published, time.time() if ts is None else ts
+        self.ready.append(i)
+
+    def get(self):
+        """Consumer: returns (frame, seq, ts) of the next unread frame as a view into the ring, or None if there is
+        none. The view stays valid until the next call, when its slot is released back to the producer.
+        """
+        try:
+            i = self.ready.pop() if self.policy == "latest" else self.ready.popleft()
+        except IndexError:
+            return None
+        if self.policy == "latest":
+            while True:  # release older unread frames, but not ones published since the pop
+                try:
+                    j = self.ready.popleft()
+                except IndexError:
+                    break
+                if self.seq[j] > self.seq[i]:
+                    self.ready.appendleft(j)
+                    break
+                self.free.append(j)
+                self.skipped += 1
+        if self.held is not None:
+            self.free.append(self.held)
+        self.held = i
+        return self.frames[i], int(self.seq[i]), float(self.ts[i])
+
+    def current(self):
+        """Consumer: returns (frame, seq, ts) of the held frame again, or None before the first get()."""
+        i = self.held
+        return None if i is None else (self.frames[i], int(self.seq[i]), float(self.ts[i]))
+
+
 class LoadStreams:
     """Loads and processes video streams for YOLOv5, supporting various sources including YouTube and IP cameras."""
 
-    def __init__(self, sources="file.streams", img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
+    def __init__(
+        self,
+        sources="file.streams",
+        img_size=640,
+        stride=32,
+        auto=True,
+        transforms=None,
+        vid_stride=1,
+        buffer=4,
+        policy="latest",
+        decode_workers=0,
+    ):
         """Initializes a stream loader for processing video streams with YOLOv5, supporting various sources including
-        YouTube.
+        YouTube. Each stream is read into a FrameRing of `buffer` frames; `policy` "latest" serves the newest frame and
+        drops the rest, "all" serves every frame in order and holds the reader back while the ring is full. With
+        decode_workers, local video files are read by a parallel VideoDecoder instead of a single cv2.VideoCapture.
         """
         torch.backends.cudnn.benchmark = True  # faster for fixed-size inference
         self.mode = "stream"
         self.img_size = img_size
         self.stride = stride
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.decode_workers = decode_workers  # parallel decode processes for video file sources
+        self.running = True  # reader threads stop once False, see close()
         sources = Path(sources).read_text().rsplit() if os.path.isfile(sources) else [sources]
         n = len(sources)
         self.sources = [clean_str(x) for x in sources]  # clean source names for later
-        self.imgs, self.fps, self.frames, self.threads = [None] * n, [0] * n, [0] * n, [None] * n
+        self.rings, self.fps, self.frames, self.threads = [None] * n, [0] * n, [0] * n, [None] * n
+        self.seq, self.ts = [0] * n, [0.0] * n  # sequence number and capture time of the frames last returned
         for i, s in enumerate(sources):  # index, source
             # Start thread to read frames from video stream
             st = f"{i + 1}/{n}: {s}... "
@@ -467,14 +611,18 @@ class LoadStreams:
             self.frames[i] = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0) or float("inf")  # infinite stream fallback
             self.fps[i] = max((fps if math.isfinite(fps) else 0) % 100, 0) or 30  # 30 FPS fallback
 
-            _, self.imgs[i] = cap.read()  # guarantee first frame
+            _, im = cap.read()  # guarantee first frame
+            self.rings[i] = FrameRing(im.shape, buffer, policy)
+            k = self.rings[i].slot()
+            self.rings[i].frames[k] = im
+            self.rings[i].publish(k)
             self.threads[i] = Thread(target=self.update, args=([i, cap, s]), daemon=True)
             LOGGER.info(f"{st} Success ({self.frames[i]} frames {w}x{h} at {self.fps[i]:.2f} FPS)")
             self.threads[i].start()
         LOGGER.info("")  # newline
 
         # check for common shapes
-        s = np.stack([letterbox(x, img_size, stride=stride, auto=auto)[0].shape for x in self.imgs])
+        s = np.stack([letterbox(x.frames[0], img_size, stride=stride, auto=auto)[0].shape for x in self.rings])
         self.rect = np.unique(s, axis=0).shape[0] == 1  # rect inference if all shapes equal
         self.auto = auto and self.rect
         self.transforms = transforms  # optional
@@ -482,20 +630,62 @@ class LoadStreams:
             LOGGER.warning("WARNING ⚠️ Stream shapes differ. For optimal performance supply similarly-shaped streams.")
 
     def update(self, i, cap, stream):
-        """Reads frames from stream `i`, updating imgs array; handles stream reopening on signal loss."""
-        n, f = 0, self.frames[i]  # frame number, frame array
-        while cap.isOpened() and n < f:
+        """Reads frames from stream `i` into its ring buffer; handles stream reopening on signal loss."""
+        if self.decode_workers and isinstance(stream, str) and os.path.isfile(stream):
+            cap.release()
+            return self._update_decoder(i, stream)
+
+        n, f, ring = 0, self.frames[i], self.rings[i]  # frame number, frame count, ring buffer
+        while cap.isOpened() and n < f and self.running:
             n += 1
-            cap.grab()  # .read() = .grab() followed by .retrieve()
+            cap.grab()  # .read() = .grab() followed by .retrieve(), both release the GIL while decoding
             if n % self.vid_stride == 0:
-                success, im = cap.retrieve()
+                k = self._slot(ring)
+                if k is None:
+                    break
+                frame = ring.frames[k]
+                success, im = cap.retrieve(frame)  # decode into the slot, no allocation
                 if success:
-                    self.imgs[i] = im
+                    if im.ctypes.data != frame.ctypes.data:  # stream size changed, OpenCV allocated a new array
+                        frame[:] = cv2.resize(im, frame.shape[1::-1])
                 else:
                     LOGGER.warning("WARNING ⚠️ Video stream unresponsive, please check your IP camera connection.")
-                    self.imgs[i] = np.zeros_like(self.imgs[i])
+                    frame[:] = 0
                     cap.open(stream)  # re-open stream if signal was lost
-            time.sleep(0.0)  # wait time
+                ring.publish(k)
+        cap.release()
+
+    def _update_decoder(self, i, path):
+        """Reads video file `i` into its ring buffer with a VideoDecoder, frames in order from parallel processes."""
+        ring, frames = self.rings[i], iter(VideoDecoder(path, self.vid_stride, self.decode_workers))
+        next(frames, None)  # first frame was read in __init__
+        for im in frames:
+            k = self._slot(ring)
+            if k is None:
+                break
+            frame = ring.frames[k]
+            frame[:] = im if im.shape == frame.shape else cv2.resize(im, frame.shape[1::-1])
+            ring.publish(k)
+        frames.close()  # stops the worker processes
+
+    def _slot(self, ring):
+        """Returns a free slot of `ring`, waiting while it is full (policy 'all'), or None once close() was called."""
+        k = ring.slot()
+        while k is None and self.running:  # ring full (policy 'all') or slot taken by the consumer, retry
+            time.sleep(0.001)
+            k = ring.slot()
+        return k
+
+    def close(self):
+        """Stops the reader threads and releases their captures."""
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+    @property
+    def dropped(self):
+        """Returns the number of frames per stream that were read but never returned, see FrameRing."""
+        return [ring.dropped for ring in self.rings]
 
     def __iter__(self):
         """Resets and returns the iterator for iterating over video frames or images in a dataset."""
@@ -507,11 +697,25 @@ class LoadStreams:
         done.
         """
         self.count += 1
-        if not all(x.is_alive() for x in self.threads) or cv2.waitKey(1) == ord("q"):  # q to quit
+        if cv2.waitKey(1) == ord("q"):  # q to quit
             cv2.destroyAllWindows()
             raise StopIteration
 
-        im0 = self.imgs.copy()
+        # Newest (policy 'all': next) frame of each stream as a view into its ring, valid until the next iteration.
+        # Waits until at least one stream ('all': every stream) has a new frame, the others repeat their last one, and
+        # stops once a reader thread has ended and its frames are used up.
+        frames = [None] * len(self.rings)
+        while True:
+            frames = [ring.get() if x is None else x for x, ring in zip(frames, self.rings)]
+            if any(x is None and not t.is_alive() and not r.ready for x, t, r in zip(frames, self.threads, self.rings)):
+                cv2.destroyAllWindows()  # a reader thread ended and its ring is drained
+                raise StopIteration
+            if all(frames) or (any(frames) and self.rings[0].policy == "latest"):
+                break
+            time.sleep(0.001)
+        frames = [ring.current() if x is None else x for x, ring in zip(frames, self.rings)]
+        im0 = [x[0] for x in frames]
+        self.seq, self.ts = [x[1] for x in frames], [x[2] for x in frames]
         if self.transforms:
             im = np.stack([self.transforms(x) for x in im0])  # transforms
         else:
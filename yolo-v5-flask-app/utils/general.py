@@ -18,6 +18,7 @@ import time
 import urllib
 from copy import deepcopy
 from datetime import datetime
+from functools import lru_cache
 from itertools import repeat
 from multiprocessing.pool import ThreadPool
 from pathlib import Path
@@ -1007,6 +1008,92 @@ def clip_segments(segments, shape):
         segments[:, 1] = segments[:, 1].clip(0, shape[0])  # y
 
 
+@lru_cache(maxsize=32)
+def class_filter_mask(classes, nc, device):
+    """Returns a cached (nc,) boolean mask of the class indices in `classes` (a tuple), for filtering without building a
+    new tensor on every NMS call.
+    """
+    mask = torch.zeros(nc, dtype=torch.bool, device=device)
+    for c in classes:
+        if 0 <= c < nc:
+            mask[c] = True
+    return mask
+
+
+def _first_k_per_image(bi, k, bs):
+    """Returns indices and within-image ranks of the first k rows of every image, for rows already in descending score
+    order with image indices `bi`.
+    """
+    bi, order = bi.sort(stable=True)  # group by image, keeping score order
+    counts = torch.bincount(bi, minlength=bs)
+    rank = torch.arange(len(bi), device=bi.device) - (counts.cumsum(0) - counts)[bi]
+    keep = rank < k
+    return order[keep], rank[keep]
+
+
+def batched_non_max_suppression(
+    prediction, conf_thres=0.25, iou_thres=0.45, classes=None, agnostic=False, multi_label=False, max_det=300, nm=0
+):
+    """
+    Non-Maximum Suppression over a whole batch at once, without a per-image Python loop.
+
+    Candidates of every image are filtered by confidence together, capped to the top `max_nms` per image and suppressed
+    in a single NMS call with boxes offset per image x class, so groups never overlap. Results are scattered into one
+    preallocated (bs, max_det, 6 + nm) tensor.
+
+    Returns:
+         list of detections, on (n,6) tensor per image [xyxy, conf, cls]
+    """
+    bs = prediction.shape[0]  # batch size
+    nc = prediction.shape[2] - nm - 5  # number of classes
+    mi = 5 + nc  # mask start index
+    max_nms = 30000  # maximum number of boxes per image into torchvision.ops.nms()
+    multi_label &= nc > 1  # multiple labels per box
+
+    # Confidence filtering up front, over all images
+    bi, ai = (prediction[..., 4] > conf_thres).nonzero(as_tuple=True)  # image and anchor index of candidates
+    x = prediction[bi, ai]  # copy, safe to modify in place
+    x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
+    box = xywh2xyxy(x[:, :4])  # center_x, center_y, width, height) to (x1, y1, x2, y2)
+    mask = x[:, mi:]  # zero columns if no masks
+
+    # Detections matrix nx6 (xyxy, conf, cls)
+    if multi_label:
+        i, j = (x[:, 5:mi] > conf_thres).nonzero(as_tuple=True)
+        x, bi = torch.cat((box[i], x[i, 5 + j, None], j[:, None].float(), mask[i]), 1), bi[i]
+    else:  # best class only
+        conf, j = x[:, 5:mi].max(1, keepdim=True)
+        keep = conf.view(-1) > conf_thres
+        x, bi = torch.cat((box, conf, j.float(), mask), 1)[keep], bi[keep]
+
+    # Filter by class
+    if classes is not None:
+        keep = class_filter_mask(tuple(classes), nc, x.device)[x[:, 5].long()]
+        x, bi = x[keep], bi[keep]
+
+    output = torch.zeros((bs, max_det, 6 + nm), device=x.device, dtype=x.dtype)
+    if not x.shape[0]:  # no boxes
+        return [o[:0] for o in output]
+
+    # Sort by confidence and remove excess boxes per image
+    i = x[:, 4].argsort(descending=True)
+    i = i[_first_k_per_image(bi[i], max_nms, bs)[0]]
+    x, bi = x[i], bi[i]
+
+    # One NMS for the whole batch, boxes offset by image x class (float32, the offsets overflow fp16)
+    groups = bi if agnostic else bi * nc + x[:, 5].long()
+    boxes = x[:, :4].float()
+    boxes = boxes + (groups[:, None] * (boxes.max() - boxes.min() + 1))
+    i = torchvision.ops.nms(boxes, x[:, 4].float(), iou_thres)  # descending score order
+
+    # Limit detections per image and scatter them into the preallocated output
+    j, rank = _first_k_per_image(bi[i], max_det, bs)
+    i = i[j]
+    output[bi[i], rank] = x[i]
+    counts = torch.bincount(bi[i], minlength=bs).tolist()
+    return [o[:n] for o, n in zip(output, counts)]
+
+
 def non_max_suppression(
     prediction,
     conf_thres=0.25,
@@ -1017,6 +1104,7 @@ def non_max_suppression(
     labels=(),
     max_det=300,
     nm=0,  # number of masks
+    batched=False,  # whole batch in one pass, see batched_non_max_suppression()
 ):
     """
     Non-Maximum Suppression (NMS) on inference results to reject overlapping detections.
@@ -1034,6 +1122,11 @@ def non_max_suppression(
     mps = "mps" in device.type  # Apple MPS
     if mps:  # MPS not fully supported yet, convert tensors to CPU before NMS
         prediction = prediction.cpu()
+    if batched and not labels:
+        output = batched_non_max_suppression(
+            prediction, conf_thres, iou_thres, classes, agnostic, multi_label, max_det, nm
+        )
+        return [x.to(device) for x in output] if mps else output
     bs = prediction.shape[0]  # batch size
     nc = prediction.shape[2] - nm - 5  # number of classes
     xc = prediction[..., 4] > conf_thres  # candidates
@@ -1085,7 +1178,7 @@ def non_max_suppression(
 
         # Filter by class
         if classes is not None:
-            x = x[(x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)]
+            x = x[class_filter_mask(tuple(classes), nc, x.device)[x[:, 5].long()]]
 
         # Apply finite constraint
         # if not torch.isfinite(x).all():
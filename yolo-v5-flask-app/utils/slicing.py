@@ -0,0 +1,91 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Sliced (tiled) inference for small objects in large images."""
+
+import numpy as np
+import torch
+
+from utils.augmentations import letterbox
+from utils.general import non_max_suppression, scale_boxes
+
+
+def slice_windows(shape, tiles=(2, 2), overlap=0.2):
+    """
+    Returns (x1, y1, x2, y2) windows of a rows x cols grid of tiles covering an image of shape (height, width), where
+    neighbouring tiles share `overlap` of their size.
+    """
+    h, w = shape[:2]
+    rows, cols = (tiles, tiles) if isinstance(tiles, int) else tiles
+
+    def spans(length, n):
+        size = length / (n - (n - 1) * overlap)  # n tiles overlapping by `overlap` cover `length` exactly
+        starts = [i * size * (1 - overlap) for i in range(n)]
+        return [(round(s), min(length, round(s + size))) for s in starts]
+
+    return [(x1, y1, x2, y2) for y1, y2 in spans(h, rows) for x1, x2 in spans(w, cols)]
+
+
+def merge_sliced_detections(det, thres=0.5, agnostic=False, max_det=1000):
+    """
+    Greedy cross-tile NMS on (n, 6) detections (x1, y1, x2, y2, conf, cls).
+
+    Boxes are matched by intersection over the smaller box, so an object cut at a tile edge is suppressed by the whole
+    object found in the neighbouring tile or the full frame, not just exact duplicates.
+    """
+    if len(det) < 2:
+        return det
+    det = det[det[:, 4].argsort(descending=True)]
+    b = det[:, :4]
+    area = (b[:, 2:] - b[:, :2]).clamp(min=0).prod(1)
+    inter = (torch.min(b[:, None, 2:], b[None, :, 2:]) - torch.max(b[:, None, :2], b[None, :, :2])).clamp(min=0).prod(2)
+    match = inter / torch.min(area[:, None], area[None]).clamp(min=1e-7) > thres
+    if not agnostic:
+        match &= det[:, None, 5] == det[None, :, 5]
+    match = match.triu(1).cpu()
+
+    keep = torch.ones(len(det), dtype=torch.bool)
+    for i in range(len(det)):
+        if keep[i]:
+            keep &= ~match[i]  # higher-confidence boxes suppress the lower-confidence ones they match
+    return det[keep.to(det.device)][:max_det]
+
+
+def sliced_inference(
+    model,
+    im0,
+    imgsz=640,
+    tiles=(2, 2),
+    overlap=0.2,
+    full_frame=True,
+    conf_thres=0.25,
+    iou_thres=0.45,
+    classes=None,
+    agnostic=False,
+    max_det=1000,
+    merge_thres=0.5,
+    augment=False,
+):
+    """
+    Detects objects in a BGR image with overlapping tiles (and optionally the full frame) run as one batch.
+
+    Every window is letterboxed to the same `imgsz` square, so the batch has one shape. Per-window detections are
+    shifted back to image pixels and merged with `merge_sliced_detections`. Returns (n, 6) detections in im0 pixels.
+    Needs a model that accepts batches (PyTorch, or exports with dynamic batch size).
+    """
+    h, w = im0.shape[:2]
+    windows = slice_windows((h, w), tiles, overlap)
+    if full_frame:
+        windows.insert(0, (0, 0, w, h))
+
+    ims = [letterbox(im0[y1:y2, x1:x2], imgsz, stride=model.stride, auto=False)[0] for x1, y1, x2, y2 in windows]
+    im = np.ascontiguousarray(np.stack(ims)[..., ::-1].transpose(0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW
+    im = torch.from_numpy(im).to(model.device)
+    im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
+    im /= 255  # 0 - 255 to 0.0 - 1.0
+
+    pred = model(im, augment=augment)
+    pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic, max_det=max_det, batched=True)
+    for det, (x1, y1, x2, y2) in zip(pred, windows):
+        det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], (y2 - y1, x2 - x1))
+        det[:, [0, 2]] += x1
+        det[:, [1, 3]] += y1
+    return merge_sliced_detections(torch.cat(pred), merge_thres, agnostic, max_det)
@@ -0,0 +1,179 @@
+"""
+Parallel, seek-based decoding of long video files
+
+A single cv2.VideoCapture decodes every frame of a file in order, including
+the frames a frame stride throws away. `VideoDecoder` yields the same frames
+(every `stride`-th one, in order) but:
+
+- splits the file into chunks of up to `chunk` output frames and decodes
+  several chunks at once in `workers` processes. Each worker seeks to its
+  chunk start, which OpenCV's FFmpeg backend resolves by jumping to the
+  preceding keyframe and decoding forward from there;
+- seeks from frame to frame instead of decoding the gap when the stride is at
+  least `seek_stride` frames (roughly a GOP, beyond which the keyframe jump is
+  cheaper than decoding every skipped frame), and otherwise only grab()s the
+  skipped frames without converting them to BGR;
+- has workers decode straight into preallocated shared memory blocks, one per
+  chunk in flight, so frames are not pickled through a pipe. The blocks take at
+  most `max_mb` in total: the chunk shrinks (and fewer chunks are in flight)
+  when large frames would not fit, e.g. 4K.
+
+It only needs OpenCV. The capture backend and its hardware decoders are
+whatever cv2.VideoCapture picks (`hw_accel=True` asks for any available
+accelerator and falls back to software). Seeking relies on a seekable file
+with a reliable frame count, so live streams and pipes are read sequentially.
+
+    for frame in VideoDecoder('video.mp4', stride=5, workers=8):
+        ...
+"""
+
+import math
+import multiprocessing
+import os
+from collections import deque
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+
+def open_capture(path, hw_accel=False, threads=0):
+    """Opens a cv2.VideoCapture, optionally with any hardware decoder and a limited number of decoder threads."""
+    params = []
+    if threads and hasattr(cv2, "CAP_PROP_N_THREADS"):
+        params += [cv2.CAP_PROP_N_THREADS, threads]
+    if hw_accel and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+        params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+    return cv2.VideoCapture(path, cv2.CAP_ANY, params) if params else cv2.VideoCapture(path)
+
+
+def read_range(path, start=0, stop=None, stride=1, seek_stride=100, hw_accel=False, threads=0, out=None):
+    """
+    Yields frames start, start + stride, ... (below stop, or to the end of the file) of a video file.
+
+    With `out`, an (n, h, w, 3) uint8 array, at most n frames are read and frame j is decoded into out[j] (resized if
+    the video's frame size differs) and yielded as that view.
+    """
+    cap = open_capture(path, hw_accel, threads)
+    try:
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)  # keyframe seek + decode up to start
+        seek = stride >= seek_stride > 0
+        i, j = start, 0
+        while (stop is None or i < stop) and (out is None or j < len(out)):
+            success, im = cap.read() if out is None else cap.read(out[j])
+            if not success:
+                break
+            if out is not None and im.ctypes.data != out[j].ctypes.data:  # frame size differs, OpenCV allocated
+                out[j] = cv2.resize(im, out.shape[2:0:-1])
+                im = out[j]
+            yield im
+            i, j = i + stride, j + 1
+            if seek:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+            else:
+                for _ in range(stride - 1):
+                    cap.grab()  # decode only, no BGR conversion
+    finally:
+        cap.release()
+
+
+def decode_chunk(name, shape, args):
+    """Pool worker: decodes one chunk (read_range arguments) into shared memory block `name` of `shape` frames and
+    returns the number of frames written.
+    """
+    shm = shared_memory.SharedMemory(name=name)  # spawned workers share the parent's resource tracker, which unlinks
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        n = sum(1 for _ in read_range(*args, out=frames))
+        del frames  # release the buffer export before closing
+        return n
+    finally:
+        shm.close()
+
+
+class VideoDecoder:
+    """Iterates over every `stride`-th frame of a video file in order, decoding chunks in `workers` processes."""
+
+    def __init__(self, path, stride=1, workers=None, chunk=16, seek_stride=100, hw_accel=False, max_mb=1024):
+        """Reads the video properties; `workers` defaults to the CPU count (capped at 8), 1 decodes in this process."""
+        self.path = str(path)
+        self.stride = max(int(stride), 1)
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.chunk = chunk
+        self.seek_stride = seek_stride
+        self.hw_accel = hw_accel
+        self.max_bytes = max_mb * 2**20  # shared memory for frames in flight
+        cap = open_capture(self.path, hw_accel)
+        assert cap.isOpened(), f"Failed to open {self.path}"
+        self.props = {p: cap.get(p) for p in (cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT)}
+        self.total = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)  # source frames, 0 if unknown
+        self.props[cv2.CAP_PROP_FRAME_COUNT] = self.total
+        cap.release()
+        self.frames = None  # iterator behind read()
+
+    def get(self, prop):
+        """Returns a cv2.CAP_PROP_* value of the file like cv2.VideoCapture.get, so the decoder can stand in for it."""
+        return self.props.get(prop, 0.0)
+
+    def __len__(self):
+        """Returns the number of frames the iterator yields (from the container's frame count)."""
+        return math.ceil(self.total / self.stride)
+
+    def __iter__(self):
+        """Yields BGR frames in order."""
+        if self.workers <= 1 or len(self) <= self.chunk:  # unknown length or short video: no parallelism to gain
+            yield from read_range(self.path, 0, None, self.stride, self.seek_stride, self.hw_accel)
+            return
+
+        frame = next(read_range(self.path, 0, 1, hw_accel=self.hw_accel), None)  # frame size after autorotation
+        if frame is None:
+            return
+        frame_bytes = frame.nbytes
+        chunk = max(1, min(self.chunk, self.max_bytes // (2 * self.workers * frame_bytes)))
+        blocks = max(1, min(2 * self.workers, self.max_bytes // (chunk * frame_bytes)))
+        shape = (chunk, *frame.shape)
+        span = chunk * self.stride
+        threads = max(1, (os.cpu_count() or 1) // self.workers)  # decoder threads per worker, no oversubscription
+
+        shms = [shared_memory.SharedMemory(create=True, size=chunk * frame_bytes) for _ in range(blocks)]
+        try:
+            views = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf) for shm in shms]
+            # spawn, not fork: the parent may hold CUDA contexts and threads
+            with multiprocessing.get_context("spawn").Pool(min(self.workers, blocks)) as pool:
+                free, pending, start = deque(range(blocks)), deque(), 0
+                while True:
+                    while free:  # chunks past the end of the file come back empty
+                        b = free.popleft()
+                        args = (self.path, start, start + span, self.stride, self.seek_stride, self.hw_accel, threads)
+                        pending.append((pool.apply_async(decode_chunk, (shms[b].name, shape, args)), b))
+                        start += span
+                    result, b = pending.popleft()
+                    n = result.get()
+                    for j in range(n):
+                        yield views[b][j].copy()  # one memcpy out of the block, which is reused
+                    if n < chunk:  # end of file
+                        break
+                    free.append(b)  # all its frames were copied out, reuse the block
+        finally:
+            views = None  # release the buffer exports before closing
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+
+    def read(self):
+        """Returns (success, frame) for the next frame like cv2.VideoCapture.read, with the stride already applied."""
+        if self.frames is None:
+            self.frames = iter(self)
+        im = next(self.frames, None)
+        return im is not None, im
+
+    def isOpened(self):
+        """Returns True until release(), like cv2.VideoCapture.isOpened."""
+        return self.path is not None
+
+    def release(self):
+        """Stops read() and its worker processes."""
+        if self.frames is not None:
+            self.frames.close()
+        self.frames, self.path = None, None
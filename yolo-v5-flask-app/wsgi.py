@@ -0,0 +1,20 @@
+"""
+WSGI entry point for the production server
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+The model is loaded at import time, so with `preload_app` gunicorn loads it once
+in the master process and every forked worker shares the weights copy-on-write
+instead of loading its own copy.
+"""
+
+import gc
+
+from app import app as application
+from app import load_yolo_model
+
+if not load_yolo_model():
+    raise RuntimeError('Failed to load YOLOv5 model')
+
+# Keep the cyclic GC from writing to (and so copying) objects inherited from the master
+gc.freeze()